@@ -42,13 +42,15 @@ class HDC_Sensor:
      - the time stamp in UCT time when the object was created.
      - a method to GET the current temperature of sensor.
      - a method to GET the humidity of the sensor.
+     - a method to GET temperature and humidity together from one conversion and one 4 byte I2C read.
+     - a method to configure the auto measurement mode, where the chip samples itself at up to 5 Hz, and the resolution.
+     - methods to start a conversion and collect its result later, or await it, without blocking while the chip converts.
      - a method to GET maximum temperature recorded by the HDC sensor object (not the maximum of the sensor)
      - a method to GET minimum temperature recorded by the HDC sensor object (not the minimum of the sensor)
-     - TODO a method to start polling the temperature sensor to record on SD card
-     - TODO a method to start polling the humidity sensor to record to SD card
-     - TODO a method to set polling in seconds between 1 and 10 seconds.
-     - TODO a method to stop polling humidity sensor.
-     - TODO a method to stop polling temperature sensor.
+     - a method to start polling temperature and humidity in the background, with a SensorSampler.
+     - a method to set polling in seconds between 1 and 10 seconds.
+     - a method to stop polling temperature and humidity.
+     - TODO a method to record the polled readings on SD card
      - TODO a method to fetch all temperature readings in  a JSON format.
      - TODO a method to fetch all humidity readings in a JSON format.
      - TODO bring logging into this module.
@@ -68,9 +70,15 @@ class HDC_Sensor:
         self.start_time = time.time()
         self._polling_period = 10
         self._register_address_set = 0x0f
+        self._register_address_device_config = 0x0e
+        self._trigger = b'\x01'                 # Measurement configuration with MEAS_TRIG set: 14 bit, temperature and humidity
+        self._auto_mode = False
+        self._first_auto = False                # Auto measurement switched on, its first result is not in the registers yet
+        self._register_address_status = 0x04
         self._register_address_temp = 0x00
         self._register_address_humidity = 0x02
         self._read_bytes = 2
+        self._sample_buf = bytearray(4)         # Temperature and humidity registers 0x00 - 0x03, reused by every collect()
 
     @staticmethod
     def convert_hdc_temp(hdc_temp):
@@ -86,7 +94,7 @@ class HDC_Sensor:
 
     def is_ready(self):
         try:
-            if not (self.i2c_peripheral.readfrom_mem(self.i2c_addr, self._register_address_set, 1)[0]):
+            if not (self.i2c_peripheral.readfrom_mem(self.i2c_addr, self._register_address_set, 1)[0] & 0x01):    # MEAS_TRIG clears when done
                 return True
             else:
                 return False
@@ -104,7 +112,141 @@ class HDC_Sensor:
         Make the sensor read a new set of values into the temperature and humidity registers of the I2C sensor.
         :return:
         """
-        self.i2c_peripheral.writeto_mem(self.i2c_addr, self._register_address_set, b'\x01')
+        if not self._auto_mode:
+            self.i2c_peripheral.writeto_mem(self.i2c_addr, self._register_address_set, self._trigger)
+
+    # Auto measurement rates in Hz and their AMM field values in the device configuration register
+    _auto_rates = ((1/120, 1), (1/60, 2), (0.1, 3), (0.2, 4), (1, 5), (2, 6), (5, 7))
+    # Resolution in bits and its TRES / HRES field value in the measurement configuration register
+    _resolutions = {14: 0, 11: 1, 9: 2}
+
+    def configure(self, auto_rate=None, resolution=14):
+        """
+        Sets how the HDC2080 measures. With an auto_rate of 0.2, 1, 2 or 5 Hz (or 1/120, 1/60 and 0.1 Hz) the chip runs
+        in auto measurement mode: it converts on its own at that rate, and temperature(), humidity(), collect() and the
+        sampler just read the latest result registers, with no trigger write on the bus. None measures on demand.
+        The resolution of 14, 11 or 9 bits applies to both temperature and humidity. Lower resolutions convert faster,
+        about 1.3, 0.75 and 0.5 ms for both values, at the cost of precision.
+        It returns True, or False with an error message if a value is not valid.
+
+        :return (boolean, string):
+        """
+        if resolution not in self._resolutions:
+            return False, "The resolution must be 14, 11 or 9 bits"
+        amm = 0
+        if auto_rate is not None:
+            for rate, value in self._auto_rates:
+                if abs(auto_rate - rate) < 0.001:
+                    amm = value
+            if not amm:
+                return False, "The auto measurement rate must be one of 1/120, 1/60, 0.1, 0.2, 1, 2 or 5 Hz"
+        res = self._resolutions[resolution]
+        meas_config = res << 6 | res << 4                   # TRES and HRES, MEAS_CONF 00 for temperature and humidity
+        try:
+            self.i2c_peripheral.writeto_mem(self.i2c_addr, self._register_address_device_config, bytes((amm << 4,)))
+            self.i2c_peripheral.writeto_mem(self.i2c_addr, self._register_address_set,
+                                            bytes((meas_config | (0x01 if amm else 0),)))   # AMM starts on MEAS_TRIG
+        except OSError as error:
+            print("The I2C bus is not responding to the I2C device address of: {}".format(self.i2c_addr))
+            print("Error value: {}".format(error))
+            return False, "The sensor could not be configured"
+        self._trigger = bytes((meas_config | 0x01,))
+        self._auto_mode = bool(amm)
+        self._first_auto = bool(amm)
+        return True, None
+
+    def start_conversion(self):
+        """
+        Starts a temperature and humidity conversion and returns at once. The chip needs about 1.3 ms; meanwhile the CPU
+        and the I2C bus are free, e.g. to start conversions on other sensors. Fetch the result with collect() once
+        conversion_ready() is True. In auto measurement mode there is nothing to start.
+
+        :return: boolean - True if the conversion was started
+        """
+        try:
+            self._measure()
+            return True
+        except OSError as error:
+            print("The I2C bus is not responding to the I2C device address of: {}".format(self.i2c_addr))
+            print("Error value: {}".format(error))
+        return False
+
+    def conversion_ready(self):
+        if self._auto_mode:
+            if self._first_auto:        # Until the first automatic measurement the result registers still read -40 C
+                self._first_auto = not self._data_ready()
+            return not self._first_auto
+        return self.is_ready()
+
+    def _data_ready(self):
+        try:
+            return bool(self.i2c_peripheral.readfrom_mem(self.i2c_addr, self._register_address_status, 1)[0] & 0x80)  # DRDY_STATUS
+        except OSError as error:
+            print("The I2C bus is not responding to the I2C device address of: {}".format(self.i2c_addr))
+            print("Error value: {}".format(error))
+        return False
+
+    def collect(self):
+        """
+        Returns the temperature in degrees centigrade and the humidity in percent of the last conversion, without starting
+        a new one. The four result registers are read in one I2C transaction into a buffer owned by the sensor.
+
+        :return: (float, float)
+        """
+        try:
+            return self._fetch()
+        except OSError as error:
+            print("The I2C bus is not responding to the I2C device address of: {}".format(self.i2c_addr))
+            print("Error value: {}".format(error))
+        return 0, 0
+
+    def _fetch(self):
+        """
+        Reads the result of the last conversion like collect(), but lets an I2C error through instead of returning 0, so
+        the sampler can skip the sample.
+        """
+        data = self._sample_buf
+        self.i2c_peripheral.readfrom_mem_into(self.i2c_addr, self._register_address_temp, data)
+        temp_in_degrees = self.convert_hdc_temp(data[0] | data[1] << 8)
+        humidity_in_percentage = self.convert_hdc_humidity(data[2] | data[3] << 8)
+        if temp_in_degrees > self._max_temp:
+            self._max_temp = temp_in_degrees
+        if temp_in_degrees < self._min_temp:
+            self._min_temp = temp_in_degrees
+        return temp_in_degrees, humidity_in_percentage
+
+    def read_all(self):
+        """
+        Returns the temperature in degrees centigrade and the humidity in percent from one conversion, so both belong to
+        the same moment. Triggers the conversion, waits the ~1.3 ms it takes and reads both values in one 4 byte burst:
+        half the I2C transactions of calling temperature() and humidity().
+
+        :return: (float, float)
+        """
+        if self._auto_mode and self.conversion_ready():
+            return self.collect()
+        if self.start_conversion():
+            for _ in range(10):
+                time.sleep_ms(1)
+                if self.conversion_ready():
+                    break
+        return self.collect()
+
+    async def read_async(self):
+        """
+        Starts a conversion and awaits its result, sleeping in uasyncio instead of blocking while the chip converts.
+
+        :return: (float, float) - temperature in degrees centigrade and humidity in percent
+        """
+        import uasyncio
+        if self._auto_mode and self.conversion_ready():
+            return self.collect()
+        if self.start_conversion():
+            for _ in range(20):
+                await uasyncio.sleep_ms(1)
+                if self.conversion_ready():
+                    break
+        return self.collect()
 
     def max_temperature(self):
         return self._max_temp
@@ -191,3 +333,19 @@ class HDC_Sensor:
             raise
 
         return return_value, message
+
+    def start_polling(self, sampler):
+        """
+        Registers the sensor with a SensorSampler, which from then on reads the temperature and humidity every polling()
+        seconds into its preallocated buffers. The sampler starts each conversion and collects it on its next visit.
+
+        :param sampler: SensorSampler
+        :return: SensorSamples
+        """
+        return sampler.add(self, ('temperature', 'humidity'), self._read_into)
+
+    def stop_polling(self, sampler):
+        sampler.remove(self)
+
+    def _read_into(self, values):
+        values[0], values[1] = self._fetch()
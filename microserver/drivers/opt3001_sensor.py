@@ -41,11 +41,14 @@ class OPT_Sensor:
      - number of activations since it was active.
      - the time stamp in UCT time when the object was created.
      - a method to GET the current LUX level of sensor.
+     - methods to start a conversion and collect its result later, or await it, without blocking while the chip converts.
+     - a method to configure continuous conversions, the 100 ms or 800 ms conversion time and the measurement range.
      - a method to GET maximum LUX level recorded by the OPT sensor object (not the maximum of the sensor)
      - a method to GET minimum LUC level recorded by the OPT sensor object (not the minimum of the sensor)
-     - TODO a method to start polling the LUX sensor to record on SD card
-     - TODO a method to set polling in seconds between 1 and 10 seconds.
-     - TODO a method to stop polling the LUX sensor.
+     - a method to start polling the LUX level in the background, with a SensorSampler.
+     - a method to set polling in seconds between 1 and 10 seconds.
+     - a method to stop polling the LUX sensor.
+     - TODO a method to record the polled readings on SD card
      - TODO a method to fetch all LUX readings in  a JSON format.
      - TODO bring logging into this module.
 
@@ -67,6 +70,10 @@ class OPT_Sensor:
         self._register_address_lux = 0
         self._register_address_humidity = 0x02
         self._read_bytes = 2
+        self._continuous = False
+        self._first_continuous = False          # Continuous mode switched on, its first result is not in the register yet
+        self._conversion_ms = 800
+        self._config_single = b'\xca\x10'         # Automatic range, 800 ms, single shot, latched interrupts
 
     @staticmethod
     def convert_lux(opt_lux):
@@ -76,7 +83,7 @@ class OPT_Sensor:
 
     def is_ready(self):
         try:
-            if (self.i2c_peripheral.readfrom_mem(self.i2c_addr, self._register_address_set, 2)[1] & 0x10) :
+            if (self.i2c_peripheral.readfrom_mem(self.i2c_addr, self._register_address_set, 2)[1] & 0x80) :     # CRF, conversion ready
                 return True
             else:
                 return False
@@ -94,38 +101,135 @@ class OPT_Sensor:
         Make the sensor read a new set of values into the temperature and humidity registers of the I2C sensor.
         :return:
         """
-        self.i2c_peripheral.writeto_mem(self.i2c_addr, self._register_address_set, b'\xca\x10')
+        self.i2c_peripheral.writeto_mem(self.i2c_addr, self._register_address_set, self._config_single)
 
-    def max_lux(self):
-        return self._max_lux
+    def configure(self, continuous=False, conversion_ms=800, lux_range=None):
+        """
+        Sets how the OPT3001 converts. In continuous mode the chip converts on its own, one result every conversion_ms,
+        and lux(), collect() and the sampler read the latest result with a single register fetch, with no configuration
+        write. Otherwise every lux() starts a single conversion and the chip sleeps in between.
+        The conversion time is 100 ms, or 800 ms for less noise. lux_range None selects the full-scale range
+        automatically, 0 to 11 fixes it to a full scale of 40.95 * 2 ** lux_range lux (40.95 to 83865.6 lux).
+        It returns True, or False with an error message if a value is not valid.
 
-    def min_lux(self):
-        return self._min_lux
+        :return (boolean, string):
+        """
+        if conversion_ms not in (100, 800):
+            return False, "The conversion time must be 100 or 800 ms"
+        if lux_range is None:
+            rn = 0x0c
+        elif isinstance(lux_range, int) and 0 <= lux_range <= 11:
+            rn = lux_range
+        else:
+            return False, "The range must be None for automatic, or an integer between 0 and 11"
+        config = rn << 12 | (conversion_ms == 800) << 11 | 0x10
+        self._config_single = bytes((config >> 8 | 0x02, config & 0xff))        # Mode 01, single shot
+        try:
+            if continuous:
+                self.i2c_peripheral.writeto_mem(self.i2c_addr, self._register_address_set,
+                                                bytes((config >> 8 | 0x06, config & 0xff)))     # Mode 11, continuous
+            elif self._continuous:
+                self.i2c_peripheral.writeto_mem(self.i2c_addr, self._register_address_set,
+                                                bytes((config >> 8, config & 0xff)))            # Mode 00, shutdown
+        except OSError as error:
+            print("The I2C bus is not responding to the I2C device address of: {}".format(self.i2c_addr))
+            print("Error value: {}".format(error))
+            return False, "The sensor could not be configured"
+        self._continuous = continuous
+        self._first_continuous = continuous
+        self._conversion_ms = conversion_ms
+        return True, None
 
-    def lux(self):
+    def start_conversion(self):
         """
-        Returns the lux level from the I2C sensor
+        Starts a single LUX conversion and returns at once. The chip needs up to 100 or 800 ms; meanwhile the CPU and the
+        I2C bus are free, e.g. to start conversions on other sensors. Fetch the result with collect() once
+        conversion_ready() is True. In continuous mode there is nothing to start.
 
-        :return: float
+        :return: boolean - True if the conversion was started
         """
+        if self._continuous:
+            return True
         try:
             self._measure()
-            data = self.i2c_peripheral.readfrom_mem(self.i2c_addr, self._register_address_lux, self._read_bytes)
-            lux_level = self.convert_lux(data)
-            if lux_level > self._max_lux:
-                self._max_lux = lux_level
-            if lux_level < self._min_lux:
-                self._min_lux = lux_level
+            return True
         except OSError as error:
             print("The I2C bus is not responding to the I2C device address of: {}".format(self.i2c_addr))
             print("Error value: {}".format(error))
-            lux_level = 0
-        except:
-            # TODO put logging into this
-            print("An unexpected error occurred while attempting to read a temperature value")
-            raise
+        return False
+
+    def conversion_ready(self):
+        if self._continuous:
+            if self._first_continuous:  # Until the first conversion completes the result register still reads 0 lux
+                self._first_continuous = not self.is_ready()
+            return not self._first_continuous
+        return self.is_ready()
+
+    def collect(self):
+        """
+        Returns the lux level of the last conversion, without starting a new one.
+
+        :return: float
+        """
+        try:
+            return self._fetch()
+        except OSError as error:
+            print("The I2C bus is not responding to the I2C device address of: {}".format(self.i2c_addr))
+            print("Error value: {}".format(error))
+        return 0
+
+    def _fetch(self):
+        """
+        Reads the result of the last conversion like collect(), but lets an I2C error through instead of returning 0, so
+        the sampler can skip the sample.
+        """
+        data = self.i2c_peripheral.readfrom_mem(self.i2c_addr, self._register_address_lux, self._read_bytes)
+        lux_level = self.convert_lux(data)
+        if lux_level > self._max_lux:
+            self._max_lux = lux_level
+        if lux_level < self._min_lux:
+            self._min_lux = lux_level
         return lux_level
 
+    async def lux_async(self):
+        """
+        Starts a conversion and awaits its result, sleeping in uasyncio instead of blocking while the chip converts.
+
+        :return: float
+        """
+        import uasyncio
+        if self._continuous and self.conversion_ready():
+            return self.collect()
+        if self.start_conversion():
+            for _ in range(20):
+                await uasyncio.sleep_ms(self._conversion_ms // 10)
+                if self.conversion_ready():
+                    break
+        return self.collect()
+
+    def max_lux(self):
+        return self._max_lux
+
+    def min_lux(self):
+        return self._min_lux
+
+    def lux(self):
+        """
+        Returns the lux level from the I2C sensor. In continuous mode this is a single fetch of the latest result, after
+        waiting for the first conversion if continuous mode was just switched on. Otherwise it starts a new single
+        conversion and returns the result of the previous one.
+
+        :return: float
+        """
+        if self._continuous:
+            for _ in range(20):
+                if self.conversion_ready():
+                    break
+                time.sleep_ms(self._conversion_ms // 10)
+        elif not self.start_conversion():
+            return 0
+        return self.collect()
+
 
     def polling(self, polling_period=None):
         """
@@ -157,3 +261,19 @@ class OPT_Sensor:
             raise
 
         return return_value, message
+
+    def start_polling(self, sampler):
+        """
+        Registers the sensor with a SensorSampler, which from then on reads the LUX level every polling() seconds into
+        its preallocated buffers. The sampler starts each conversion and collects it on its next visit.
+
+        :param sampler: SensorSampler
+        :return: SensorSamples
+        """
+        return sampler.add(self, ('lux',), self._read_into)
+
+    def stop_polling(self, sampler):
+        sampler.remove(self)
+
+    def _read_into(self, values):
+        values[0] = self._fetch()
@@ -0,0 +1,214 @@
+"""
+MIT License
+Copyright (c) 2019 Samsung. n.herriot@samsung.com
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+import time
+from array import array
+
+try:
+    import micropython, machine
+except ImportError:
+    micropython = machine = None
+
+__version__ = '0.1.0'
+__author__ = 'Nicholas Herriot'
+__license__ = "MIT"
+
+
+class SensorSamples:
+    """
+    The buffers of one sensor registered with a SensorSampler. They are allocated once when the sensor is added and then
+    only overwritten: 'values' holds the latest value of each field, 'history' the last 'length' samples of every field
+    one after the other, oldest first from 'index', and 'times' their time.ticks_ms() stamps.
+    """
+
+    def __init__(self, sensor, fields, read_into, length):
+        self.sensor = sensor
+        self.fields = fields
+        self.read_into = read_into
+        self.values = array('f', [0] * len(fields))
+        self.history = array('f', [0] * (len(fields) * length))
+        self.times = array('L', [0] * length)
+        self.length = length
+        self.index = 0                              # Next history slot written
+        self.count = 0                              # Samples taken so far
+        self.taken = 0                              # ticks_ms() of the latest sample
+        self.due = 0                                # ticks_ms() of the next sample
+        self.split = hasattr(sensor, 'start_conversion')    # Conversions are started on one visit, collected on a later one
+        self.converting = False
+
+    def value(self, field):
+        """
+        Returns the latest value of 'field', e.g. 'temperature', or None before the first sample.
+
+        :return: float OR None
+        """
+        if not self.count:
+            return None
+        return self.values[self.fields.index(field)]
+
+
+class SensorSampler:
+    """
+    Reads every registered sensor on its own period, in the background, into preallocated buffers. Web pages and other
+    readers then take the values from RAM instead of the I2C bus, and the sample times no longer depend on when
+    requests arrive.
+
+    The period of each sensor is its polling() setting in seconds, read again before each sample so a change applies at
+    once. A sensor is added with the names of its fields and a function writing one sample into an array('f') of that
+    size, usually by the sensor itself, see HDC_Sensor.start_polling().
+
+    Sensors with a start_conversion() method are never waited for: the sampler starts a conversion when the sensor is
+    due and collects it on a later tick once conversion_ready(), so the conversions of several sensors overlap and no
+    tick spends its time waiting on a chip.
+
+    The sampler is driven either by a timer, whose interrupt hands the sampling over to micropython.schedule() so the
+    I2C transactions run outside of the interrupt, or by a uasyncio task. It keeps 'history' samples of every sensor.
+
+    Example:
+        sampler = SensorSampler(history=60)
+        humidityTemperature.start_polling(sampler)
+        sampler.start()
+        temperature = sampler.samples(humidityTemperature).value('temperature')
+    """
+
+    def __init__(self, history=60, tick_ms=1000, timer_id=-1):
+        self.history_length = history
+        self.tick_ms = tick_ms
+        self.timer_id = timer_id
+        self._entries = []
+        self._timer = None
+        self._sample_ref = self._sample             # Bound once, the timer interrupt must not allocate
+        self.missed = 0                             # Timer ticks dropped because the schedule queue was full
+
+    def add(self, sensor, fields, read_into):
+        """
+        Registers 'sensor', sampled every sensor.polling() seconds by calling read_into(values).
+
+        :param sensor: the driver object, it must have a polling() method
+        :param fields: tuple of field names, e.g. ('temperature', 'humidity')
+        :param read_into: function writing one sample of every field into the array('f') it is given, an OSError from it
+                          skips the sample
+        :return: SensorSamples
+        """
+        self.remove(sensor)
+        entry = SensorSamples(sensor, fields, read_into, self.history_length)
+        entry.due = time.ticks_ms()
+        self._entries.append(entry)
+        return entry
+
+    def remove(self, sensor):
+        self._entries = [e for e in self._entries if e.sensor is not sensor]
+
+    def samples(self, sensor):
+        """
+        Returns the SensorSamples of a registered sensor, or None.
+        """
+        for entry in self._entries:
+            if entry.sensor is sensor:
+                return entry
+        return None
+
+    def _sample(self, _=None):
+        now = time.ticks_ms()
+        slack = self.tick_ms // 2                   # A tick running a little early, from schedule jitter, still counts
+        for entry in self._entries:
+            sensor = entry.sensor
+            if entry.converting:
+                if sensor.conversion_ready():
+                    entry.converting = False
+                    self._store(entry, now)
+                elif time.ticks_diff(now, entry.due) < -slack:
+                    continue                        # Still converting, collected on a later tick
+            if time.ticks_diff(now, entry.due) < -slack:
+                continue
+            period = sensor.polling() * 1000
+            entry.due = time.ticks_add(entry.due, period)       # Keeps the period steady whatever the tick latency
+            if time.ticks_diff(now, entry.due) >= 0:
+                entry.due = time.ticks_add(now, period)         # Fell a whole period behind, restart from now
+            if entry.split:
+                entry.converting = sensor.start_conversion()
+            else:
+                self._store(entry, now)
+
+    def _store(self, entry, now):
+        try:
+            entry.read_into(entry.values)
+        except OSError as error:
+            print("Sampling {} failed: {}".format(entry.fields, error))
+            return
+        n = len(entry.fields)
+        i = entry.index
+        for k in range(n):
+            entry.history[i * n + k] = entry.values[k]
+        entry.times[i] = now
+        entry.index = (i + 1) % entry.length
+        entry.count += 1
+        entry.taken = now
+
+    def prime(self, timeout_ms=1000):
+        """
+        Takes a first sample of every sensor now. The conversions of all sensors are started together and run side by
+        side, so this waits for the slowest sensor only, at most 'timeout_ms'.
+        """
+        self._sample()
+        start = time.ticks_ms()
+        while time.ticks_diff(time.ticks_ms(), start) < timeout_ms:
+            waiting = False
+            for entry in self._entries:
+                if entry.converting:
+                    if entry.sensor.conversion_ready():     # Stored at once, the OPT3001 clears its ready flag when read
+                        entry.converting = False
+                        self._store(entry, time.ticks_ms())
+                    else:
+                        waiting = True
+            if not waiting:
+                break
+            time.sleep_ms(10)
+
+    def _tick(self, timer):
+        try:
+            micropython.schedule(self._sample_ref, None)
+        except RuntimeError:
+            self.missed += 1
+
+    def start(self):
+        """
+        Takes a first sample of every sensor, then samples from a timer interrupt through micropython.schedule().
+        """
+        self.stop()
+        self.prime()
+        self._timer = machine.Timer(self.timer_id, period=self.tick_ms, mode=machine.Timer.PERIODIC,
+                                    callback=self._tick)
+
+    async def run(self):
+        """
+        Samples from a uasyncio task instead of a timer: uasyncio.create_task(sampler.run())
+        """
+        import uasyncio
+        while True:
+            self._sample()
+            await uasyncio.sleep_ms(self.tick_ms)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
@@ -0,0 +1,94 @@
+"""
+MIT License
+Copyright (c) 2019 Samsung. n.herriot@samsung.com
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+import time, _thread
+
+__version__ = '0.1.0'
+__author__ = 'Nicholas Herriot'
+__license__ = "MIT"
+
+
+class SensorSnapshot:
+    """
+    One reading of a set of sensors, shared by every page, event stream and web socket of the web server.
+
+    read() returns the last reading while it is younger than max_age_ms. Once it is older, the first caller takes a new
+    reading by calling sample_func. Callers arriving meanwhile, from other threads, wait for that same reading instead
+    of putting their own transactions on the I2C bus. So the sensors are read at most once per max_age_ms, however many
+    requests come in.
+
+    The snapshot object has internal state for:
+     - the last reading and the time it was taken.
+     - the number of readings taken and of reads served from the last reading.
+
+    Example:
+        snapshot = SensorSnapshot(lambda: {'lux': light.lux()}, max_age_ms=500)
+        lux = snapshot.read()['lux']
+    """
+
+    def __init__(self, sample_func, max_age_ms=1000):
+        self._sample_func = sample_func
+        self.max_age_ms = max_age_ms
+        self._value = None
+        self._taken = 0
+        self._generation = 0
+        self._lock = _thread.allocate_lock()      # Held while a reading is taken
+        self.readings = 0
+        self.hits = 0
+
+    def read(self):
+        """
+        Returns the shared reading, taking a new one if the last is older than max_age_ms.
+
+        :return: the value returned by sample_func
+        """
+        value = self._value
+        if value is not None and time.ticks_diff(time.ticks_ms(), self._taken) < self.max_age_ms:
+            self.hits += 1
+            return value
+        generation = self._generation
+        with self._lock:
+            if self._generation != generation:       # Another caller took the reading while this one waited
+                self.hits += 1
+                return self._value
+            value = self._sample_func()
+            self._value = value
+            self._taken = time.ticks_ms()
+            self._generation += 1
+            self.readings += 1
+        return value
+
+    def invalidate(self):
+        """
+        Makes the next read() take a new reading.
+        """
+        self._value = None
+
+    def age_ms(self):
+        """
+        Returns the age of the last reading in ms, or None if there is none.
+
+        :return: int OR None
+        """
+        if self._value is None:
+            return None
+        return time.ticks_diff(time.ticks_ms(), self._taken)
@@ -1,4 +1,22 @@
 import sys
+import os
+
+try:
+    from io import IOBase
+except ImportError:
+    IOBase = object
+
+try:
+    from time import ticks_ms
+except ImportError:
+    from time import time
+    def ticks_ms():
+        return int(time() * 1000) & 0x3FFFFFFF
+
+try:
+    from _thread import allocate_lock, start_new_thread
+except ImportError:
+    allocate_lock = start_new_thread = None
 
 CRITICAL = 50
 ERROR    = 40
@@ -17,32 +35,245 @@ _level_dict = {
 
 _stream = sys.stderr
 
+
+class RingBuffer:
+    """
+    Keeps the last 'size' records unformatted in preallocated slots: the level, a ticks_ms() timestamp, the logger name,
+    the format string and the argument tuple. Logging a record only stores these references; the 'msg % args'
+    formatting and the stream write happen when the buffer is drained. Arguments are formatted as they are at drain
+    time, and stay referenced until then. When the buffer is full the oldest record is overwritten and counted.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.levels = bytearray(size)
+        self.times = [0] * size
+        self.names = [None] * size
+        self.msgs = [None] * size
+        self.args = [None] * size
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+        self._lock = allocate_lock() if allocate_lock else None
+
+    def put(self, level, name, msg, args):
+        lock = self._lock
+        if lock:
+            lock.acquire()
+        i = self.head
+        self.levels[i] = level
+        self.times[i] = ticks_ms()
+        self.names[i] = name
+        self.msgs[i] = msg
+        self.args[i] = args
+        i += 1
+        self.head = 0 if i == self.size else i
+        if self.count < self.size:
+            self.count += 1
+        else:
+            self.dropped += 1
+        if lock:
+            lock.release()
+
+    def take(self):
+        """Empties the buffer, returns its records oldest first as (level, ms, name, msg, args) and the dropped count"""
+        lock = self._lock
+        if lock:
+            lock.acquire()
+        recs = []
+        i = (self.head - self.count) % self.size
+        for _ in range(self.count):
+            recs.append((self.levels[i], self.times[i], self.names[i], self.msgs[i], self.args[i]))
+            self.names[i] = self.msgs[i] = self.args[i] = None
+            i = (i + 1) % self.size
+        dropped = self.dropped
+        self.count = self.dropped = 0
+        if lock:
+            lock.release()
+        return recs, dropped
+
+    def lines(self):
+        """Empties the buffer, yielding one formatted line per record"""
+        recs, dropped = self.take()
+        if dropped:
+            yield "WARN:logging:%d older records were overwritten\n" % dropped
+        for level, ms, name, msg, args in recs:
+            if args:
+                try:
+                    msg = msg % args
+                except Exception:
+                    msg = "%s %r" % (msg, args)
+            yield "%d %s:%s:%s\n" % (ms, _level_str(level), name, msg)
+
+    def drain(self, stream=None):
+        stream = stream or _stream
+        n = 0
+        for line in self.lines():
+            stream.write(line)
+            n += 1
+        return n
+
+
+class RotatingFile(IOBase):
+    """
+    A log stream for a file on flash or SD card. Written lines are gathered in RAM and reach the file only as whole
+    'block_size' blocks, the remainder on flush(). Once the file would grow past 'max_bytes' it is finished with the
+    lines of the block that end in it and renamed to 'filename.1', so every file starts and ends with a whole record.
+    Older generations move up to 'filename.<backup_count>' and the oldest one is deleted.
+    """
+
+    def __init__(self, filename, max_bytes=32 * 1024, backup_count=2, block_size=512):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buf = bytearray(block_size)
+        self._len = 0
+        self._file = None
+        self._size = 0
+        self._lock = allocate_lock() if allocate_lock else None
+
+    def write(self, s):
+        if isinstance(s, str):
+            s = s.encode()
+        mv = memoryview(s)
+        lock = self._lock
+        if lock:
+            lock.acquire()
+        try:
+            block = len(self._buf)
+            i = 0
+            while i < len(mv):
+                n = min(block - self._len, len(mv) - i)
+                self._buf[self._len:self._len + n] = mv[i:i + n]
+                self._len += n
+                i += n
+                if self._len == block:
+                    self._write_buf()
+        finally:
+            if lock:
+                lock.release()
+        return len(mv)
+
+    def flush(self):
+        lock = self._lock
+        if lock:
+            lock.acquire()
+        try:
+            if self._len:
+                self._write_buf()
+        finally:
+            if lock:
+                lock.release()
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_buf(self):
+        if self._file is None:
+            try:
+                self._size = os.stat(self.filename)[6]
+            except OSError:
+                self._size = 0
+            self._file = open(self.filename, 'ab')
+        data = memoryview(self._buf)[:self._len]
+        if self._size and self._size + self._len > self.max_bytes:
+            end = self._len
+            while end and self._buf[end - 1] != 0x0A:
+                end -= 1
+            if end:                     # Without a line end in the block, the rotation waits for the next one
+                self._file.write(data[:end])
+                self._rotate()
+                data = data[end:]
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self._len = 0
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count, 0, -1):
+            dst = "%s.%d" % (self.filename, i)
+            src = self.filename if i == 1 else "%s.%d" % (self.filename, i - 1)
+            try:
+                os.remove(dst)          # FAT does not rename onto an existing file
+            except OSError:
+                pass
+            try:
+                os.rename(src, dst)
+            except OSError:
+                pass
+        self._file = open(self.filename, 'wb')
+        self._size = 0
+
+
+def _level_str(level):
+    l = _level_dict.get(level)
+    if l is not None:
+        return l
+    return "LVL%s" % level
+
+
+def _disabled(msg, *args):
+    pass
+
+
 class Logger:
+    """
+    Each logger has its own level, NOTSET follows the level of basicConfig(). The effective level is kept in 'min' so
+    isEnabledFor() is a single comparison, and debug() and info() are replaced by a no-op while disabled. Hot paths
+    can skip building the arguments too:
+
+        if __debug__ and log.isEnabledFor(DEBUG):
+            log.debug("Sent %d octets", n)
 
-    level = NOTSET
+    Frozen or cross-compiled with optimisation (mpy-cross -O1, micropython.opt_level(1)), __debug__ is False and such
+    blocks are left out of the bytecode.
+    """
 
     def __init__(self, name):
         self.name = name
+        self.level = NOTSET
+        self._update()
 
     def _level_str(self, level):
-        l = _level_dict.get(level)
-        if l is not None:
-            return l
-        return "LVL%s" % level
+        return _level_str(level)
+
+    def _update(self):
+        self.min = self.level or _level
+        for name, level in (('debug', DEBUG), ('info', INFO)):
+            if level < self.min:
+                setattr(self, name, _disabled)
+            elif name in self.__dict__:
+                delattr(self, name)
 
     def setLevel(self, level):
         self.level = level
+        self._update()
+
+    def getEffectiveLevel(self):
+        return self.min
 
     def isEnabledFor(self, level):
-        return level >= (self.level or _level)
+        return level >= self.min
 
     def log(self, level, msg, *args):
-        if level >= (self.level or _level):
+        if level >= self.min:
+            if _ring is not None:
+                _ring.put(level, self.name, msg, args)
+                if level >= _flush_level:
+                    _ring.drain(_stream)
+                    _flush(_stream)
+                return
             _stream.write("%s:%s:" % (self._level_str(level), self.name))
             if not args:
                 print(msg, file=_stream)
             else:
                 print(msg % args, file=_stream)
+            if level >= _flush_level:
+                _flush(_stream)
 
     def debug(self, msg, *args):
         self.log(DEBUG, msg, *args)
@@ -61,7 +292,10 @@ class Logger:
 
     def exc(self, e, msg, *args):
         self.log(ERROR, msg, *args)
+        if _ring is not None:
+            _ring.drain(_stream)
         sys.print_exception(e, _stream)
+        _flush(_stream)
 
     def exception(self, msg, *args):
         self.exc(sys.exc_info()[1], msg, *args)
@@ -69,6 +303,14 @@ class Logger:
 
 _level = INFO
 _loggers = {}
+_ring = None
+_flush_level = ERROR
+_config = 0
+
+def _flush(stream):
+    f = getattr(stream, 'flush', None)
+    if f:
+        f()
 
 def getLogger(name):
     if name in _loggers:
@@ -83,12 +325,52 @@ def info(msg, *args):
 def debug(msg, *args):
     getLogger(None).debug(msg, *args)
 
-def basicConfig(level=INFO, filename=None, stream=None, format=None):
-    global _level, _stream
+def basicConfig(level=INFO, filename=None, stream=None, format=None, ring_size=0, flush_level=ERROR):
+    """
+    With 'ring_size' records are kept unformatted in a RingBuffer of that many records instead of being written at
+    once. They are written by drain(), by a start_flush() thread, or as soon as a record of 'flush_level' or above
+    is logged, which also flushes the stream.
+    'filename' logs to a RotatingFile with its default size and generations, pass 'stream=RotatingFile(...)' for others.
+    """
+    global _level, _stream, _ring, _flush_level, _config
     _level = level
+    for l in _loggers.values():
+        l._update()
+    _ring = RingBuffer(ring_size) if ring_size else None
+    _flush_level = flush_level
+    _config += 1
+    if filename is not None:
+        stream = RotatingFile(filename)
     if stream:
+        if _stream is not stream and isinstance(_stream, RotatingFile):
+            _stream.close()
         _stream = stream
-    if filename is not None:
-        print("logging.basicConfig: filename arg is not supported")
     if format is not None:
         print("logging.basicConfig: format arg is not supported")
+
+def drain(stream=None):
+    """Writes the records buffered by basicConfig(ring_size=...) to 'stream', returns how many were written"""
+    if _ring is None:
+        return 0
+    return _ring.drain(stream or _stream)
+
+def drain_lines():
+    """Empties the ring buffer, yielding its formatted lines, e.g. for a web page"""
+    if _ring is not None:
+        yield from _ring.lines()
+
+def start_flush(interval_sec=1):
+    """
+    Drains the ring buffer, if any, and flushes the stream every 'interval_sec' from a background thread, until
+    basicConfig() is called again. Records buffered by a RotatingFile then reach the file at least this often.
+    """
+    from time import sleep
+    config = _config
+    def flush():
+        while _config == config:
+            sleep(interval_sec)
+            if _config == config:
+                drain()
+                _flush(_stream)
+    if start_new_thread:
+        start_new_thread(flush, ())
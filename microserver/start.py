@@ -26,6 +26,7 @@ __license__ = "MIT"
 
 from wifi.wifi_connect import *                          # Import the WiFi Manager module to help us monitor and stay connected to poor wifi
 from web.microWebSrv import MicroWebSrv                  # Import the WiFi microweb server object to allow us to run a mini web server on the board
+from web.microWebSrv import MicroWebSrvTemplate          # The status page is split into pre-encoded fragments once, at import
 from urls import *                                       # Import all the routes that are being used in our web pages and have functions controlling each route
 import machine,  ubinascii                               # Used to get machine ID, and convert fro b-strings
 #from ssd1306 import SSD1306_I2C
@@ -46,7 +47,7 @@ def create_web_server(https=False):
     else:
         server = MicroWebSrv(webPath='www/')
     server.MaxWebSocketRecvLen = 256
-    server.WebSocketThreaded = False
+    server.WebSocketThreaded = True                     # Each web socket reads in its own thread, the sensor hub sends to them
     server.AcceptWebSocketCallback = acceptWebSocketCallback
     server.Start(threaded=True)
     return server
@@ -65,9 +66,7 @@ myWifi.retries(5)                                       # Try connect 5 times si
 # ============================================================================
 
 
-@MicroWebSrv.route('/status')
-def _httpHandlerStatustGet(httpClient, httpResponse):
-    content = """\
+_statusPage = MicroWebSrvTemplate("""\
 	<!DOCTYPE html>
 	<html lang=en>
         <head>
@@ -88,14 +87,16 @@ def _httpHandlerStatustGet(httpClient, httpResponse):
             <br />
         </body>
     </html>
-    """ % (myWifi.status()[1]['Current IP address'],
-           myWifi.status()[1]['SSID name'],
-           myWifi.status()[1]['Connected'],
-           "Micropython:{}".format(srv._boardType),
-           ubinascii.hexlify(machine.unique_id()).decode('utf-8'))
-    httpResponse.WriteResponseOk(headers	= None,
-                                  contentType	="text/html", contentCharset="UTF-8",
-                                  content 		 =content)
+    """)
+
+
+@MicroWebSrv.route('/status')
+def _httpHandlerStatustGet(httpClient, httpResponse):
+    httpResponse.WriteResponseTemplate(_statusPage, (myWifi.status()[1]['Current IP address'],
+                                                     myWifi.status()[1]['SSID name'],
+                                                     myWifi.status()[1]['Connected'],
+                                                     "Micropython:{}".format(srv._boardType),
+                                                     ubinascii.hexlify(machine.unique_id()).decode('utf-8')))
 
 # ============================================================================
 # ===( Create A WiFi Connection and Start Web Server )========================
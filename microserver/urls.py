@@ -23,12 +23,18 @@ __version__ = '0.1.0'
 __author__ = 'Nicholas Herriot'
 __license__ = "MIT"
 
-import machine, time
+import machine, time, struct
 from web.microWebSrv import MicroWebSrv                # Import the WiFi microweb server object to allow us to run a mini web server on the board
+from web.microWebSrv import MicroWebSrvEventSource     # Pushes live readings to browsers with Server-Sent Events
+from web.microWebSrv import MicroWebSrvBroadcastHub    # Fans binary sensor frames out to web socket clients
+from web.microWebSrv import MicroWebSrvTemplate        # Pages split into pre-encoded fragments once, filled in per request
+from libraries.logging import logging                  # The server keeps its log records in a ring buffer, see LOG_TOKEN
 from drivers.sr_501_sensor import PIR
 from drivers.rcwl_0516_sensor import MicrowaveRadar
 from drivers.hdc2080_sensor import HDC_Sensor
 from drivers.opt3001_sensor import OPT_Sensor
+from drivers.sensor_snapshot import SensorSnapshot
+from drivers.sensor_sampler import SensorSampler
 # ----------------------------------------------------------------------------
 
 
@@ -52,6 +58,25 @@ i2c = machine.I2C('X')                             # Create our I2C object to ta
 humidityTemperature = HDC_Sensor(i2c)              # Create our humidity and temperature sensor see: https://pybd.io/hw/tile_sensa.html
 lightLevel = OPT_Sensor(i2c)                       # Create our lux level sensor see: https://pybd.io/hw/tile_sensa.html
 
+sampler = SensorSampler(history=60)                # Reads the I2C sensors in the background, keeping their last 60 samples
+humidityTemperature.polling(1)                     # Sample temperature and humidity every second
+humidityTemperature.configure(auto_rate=1)         # The chip measures itself once a second, a sample is one register read
+lightLevel.polling(1)                              # Sample the lux level every second
+lightLevel.configure(continuous=True, conversion_ms=100)    # The chip converts on its own, a sample is one register read
+climateSamples = humidityTemperature.start_polling(sampler)
+lightSamples = lightLevel.start_polling(sampler)
+sampler.start()                                    # Takes the first samples now, then from a timer through micropython.schedule()
+
+
+def _readClimate():
+    """Takes the latest samples from the sampler buffers, no I2C. The reading is shared through the 'climate' snapshot."""
+    return {'temperature': climateSamples.values[0],
+            'humidity': climateSamples.values[1],
+            'lux': lightSamples.values[0]}
+
+
+climate = SensorSnapshot(_readClimate, max_age_ms=1000)   # Pages, events and web socket frames share one reading per second
+
 # ============================================================================
 # ===( Define URL Path for pages)=============================================
 # ============================================================================
@@ -84,20 +109,7 @@ def _httpHandlerTestGet(httpClient, httpResponse):
 
 
 
-@MicroWebSrv.route('/sensors')
-def _httpHandlerSensorsGet(httpClient, httpResponse):
-
-    temperature = humidityTemperature.temperature()
-    humidity =  humidityTemperature.humidity()
-    lux = lightLevel.lux()
-    current_time = time.localtime()[:-2]
-
-    print("** Current temperature: {}".format(temperature))
-    print("** Current humidity: {}".format(humidity))
-    print("** Current lux: {}".format(lux))
-    print("** Current time: {}".format(current_time))
-
-    content = """\
+_sensorsPage = MicroWebSrvTemplate("""\
 	<!DOCTYPE html>
 	<html lang=en>
         <head>
@@ -122,35 +134,66 @@ def _httpHandlerSensorsGet(httpClient, httpResponse):
             <br />
         </body>
     </html>
-	""" % (current_time, pir.pir_total(), microRadar.mr_total(), humidityTemperature.temperature(), humidityTemperature.humidity(), lightLevel.lux(), "N/A",)
-    httpResponse.WriteResponseOk(headers	= None,
-                                  contentType	= "text/html",contentCharset = "UTF-8",
-                                  content 		 = content)
+	""")
 
 
+@MicroWebSrv.route('/sensors')
+def _httpHandlerSensorsGet(httpClient, httpResponse):
 
+    reading = climate.read()
+    temperature = reading['temperature']
+    humidity = reading['humidity']
+    lux = reading['lux']
+    current_time = time.localtime()[:-2]
 
+    print("** Current temperature: {}".format(temperature))
+    print("** Current humidity: {}".format(humidity))
+    print("** Current lux: {}".format(lux))
+    print("** Current time: {}".format(current_time))
 
-@MicroWebSrv.route('/AR')
-def _httpHandlerARGet(httpClient, httpResponse):
+    httpResponse.WriteResponseTemplate(_sensorsPage, (current_time, pir.pir_total(), microRadar.mr_total(),
+                                                      temperature, humidity, lux, "N/A"))
 
-    temperature = humidityTemperature.temperature()
-    valueTemperature = ' "Temperature value: {}" '.format(temperature)
-    print("** The Temperature value is: {} ** ".format(valueTemperature))
 
-    humidity = humidityTemperature.humidity()
-    valueHumidity = ' "Humidity value: {}" '.format(humidity)
-    print("** The Humidity value is: {} ** ".format(valueHumidity))
 
-    lux = lightLevel.lux()
-    valueLux = ' "LUX value: {}" '.format(lux)
-    print("** The LUX value is: {} ** ".format(valueLux))
 
-    current_time = time.localtime()[:-2]
-    valueTime = ' "Time: {}" '.format(current_time)
-    print("** The time value is: {} ** ".format(valueTime))
 
-    content = """\
+def _sampleSensors():
+    """Takes one reading of every sensor. It is shared by all the browsers subscribed to '/events'."""
+    reading = climate.read()
+    return {'temperature': reading['temperature'],
+            'humidity': reading['humidity'],
+            'lux': reading['lux'],
+            'pir': pir.pir_total(),
+            'radar': microRadar.mr_total()}
+
+
+sensorEvents = MicroWebSrvEventSource(_sampleSensors, intervalSec=1)   # Sensors are read once a second, events only sent on change
+
+
+@MicroWebSrv.route('/events')
+def _httpHandlerEventsGet(httpClient, httpResponse):
+    # Browser side: new EventSource('/events').onmessage = function (e) { var reading = JSON.parse(e.data); ... }
+    return sensorEvents.Accept(httpClient, httpResponse)
+
+
+LOG_TOKEN = None        # Set to a secret to serve the server log at /log?token=<secret>, None leaves '/log' out
+
+
+def _httpHandlerLogGet(httpClient, httpResponse):
+    # Formats and empties the buffered log records of the server, oldest first
+    if httpClient.GetRequestQueryParams().get('token') != LOG_TOKEN:
+        return httpResponse.WriteResponseForbidden()
+    httpResponse.WriteResponseStream(logging.drain_lines(), contentType="text/plain", contentCharset="UTF-8")
+
+
+if LOG_TOKEN:
+    MicroWebSrv.route('/log')(_httpHandlerLogGet)
+
+
+
+
+_arPage = MicroWebSrvTemplate("""\
 	<!DOCTYPE html>
 <html lang="en">
 
@@ -208,10 +251,31 @@ def _httpHandlerARGet(httpClient, httpResponse):
         <a-camera-static/>
     </a-scene>
 </html>
-	""" % (valueTime, valueTemperature, valueHumidity, valueLux)
-    httpResponse.WriteResponseOk(headers	= None,
-                                  contentType	= "text/html",contentCharset = "UTF-8",
-                                  content 		 = content)
+	""")
+
+
+@MicroWebSrv.route('/AR')
+def _httpHandlerARGet(httpClient, httpResponse):
+
+    reading = climate.read()
+
+    temperature = reading['temperature']
+    valueTemperature = ' "Temperature value: {}" '.format(temperature)
+    print("** The Temperature value is: {} ** ".format(valueTemperature))
+
+    humidity = reading['humidity']
+    valueHumidity = ' "Humidity value: {}" '.format(humidity)
+    print("** The Humidity value is: {} ** ".format(valueHumidity))
+
+    lux = reading['lux']
+    valueLux = ' "LUX value: {}" '.format(lux)
+    print("** The LUX value is: {} ** ".format(valueLux))
+
+    current_time = time.localtime()[:-2]
+    valueTime = ' "Time: {}" '.format(current_time)
+    print("** The time value is: {} ** ".format(valueTime))
+
+    httpResponse.WriteResponseTemplate(_arPage, (valueTime, valueTemperature, valueHumidity, valueLux))
 
 
 
@@ -278,16 +342,49 @@ def _httpHandlerEditWithArgs(httpClient, httpResponse, args={}):
 # ----------------------------------------------------------------------------
 
 
+# Binary frames sent to web socket clients, all little endian:
+#   sample: type 1 (B), time in seconds (I), temperature in 1/100 C (h), humidity in 1/100 % (H), lux in 1/100 lux (I),
+#           PIR total (H), radar total (H)                                                                -> 17 octets
+#   motion: type 2 (B), time in seconds (I), source 1 = PIR / 2 = radar (B), total of that sensor (H)     -> 8 octets
+SAMPLE_FRAME = '<BIhHIHH'
+MOTION_FRAME = '<BIBH'
+
+_motionTotals = [None, None]                           # Last PIR and radar totals seen by the sampler
+
+
+def _sampleFrames():
+    """Builds the frames broadcast to every web socket client once a second: a motion frame per sensor that triggered
+    since the last call, and a sample frame."""
+    now = time.time()
+    totals = (pir.pir_total(), microRadar.mr_total())
+    frames = []
+    for i in range(2):
+        if _motionTotals[i] is not None and totals[i] != _motionTotals[i]:
+            frames.append(struct.pack(MOTION_FRAME, 2, now, i + 1, totals[i] & 0xFFFF))
+        _motionTotals[i] = totals[i]
+    reading = climate.read()
+    frames.append(struct.pack(SAMPLE_FRAME, 1, now,
+                              int(reading['temperature'] * 100),
+                              int(reading['humidity'] * 100),
+                              int(reading['lux'] * 100),
+                              totals[0] & 0xFFFF, totals[1] & 0xFFFF))
+    return frames
+
+
+sensorHub = MicroWebSrvBroadcastHub(_sampleFrames, intervalSec=1, queueLen=8)   # A slow client drops its oldest frames
+
+
 def acceptWebSocketCallback(webSocket, httpClient) :
     print("WS ACCEPT")
-    webSocket. RecvTextCallback = _recvTextCallback
-    webSocket.RecvBinaryCallback = _recvBinaryCallback
-    webSocket. ClosedCallback = _closedCallback
+    webSocket.RecvTextCallback = recvTextCallback
+    webSocket.RecvBinaryCallback = recvBinaryCallback
+    webSocket.ClosedCallback = closedCallback
+    sensorHub.Add(webSocket, httpClient)
 
 
 def recvTextCallback(webSocket, msg):
     print("WS RECV TEXT : %s" % msg)
-    webSocket.SendText("Reply for %s" % msg)
+    sensorHub.Send(webSocket, "Reply for %s" % msg)     # Not at the same time as a frame from the hub thread
 
 
 def recvBinaryCallback(webSocket, data):
@@ -296,6 +393,7 @@ def recvBinaryCallback(webSocket, data):
 
 def closedCallback(webSocket):
     print("WS CLOSED")
+    sensorHub.Remove(webSocket)
 
 # ----------------------------------------------------------------------------
 
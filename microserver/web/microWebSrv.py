@@ -6,16 +6,37 @@ Copyright © 2018 Jean-Christophe Bos & HC² (www.hc2.fr)
 
 from    json        import loads, dumps
 from    os          import stat, uname
-from    _thread     import start_new_thread
+from    _thread     import start_new_thread, allocate_lock
+from    array       import array
 import  socket
 import  ssl
 import  gc
 import  re
+import  sys
+
+from    time        import sleep
+
+try :
+    from time import gmtime
+except :
+    from time import localtime as gmtime
+
+try :
+    from time import ticks_us, ticks_diff, ticks_add
+except :
+    from time import perf_counter
+    def ticks_us() :
+        return int(perf_counter() * 1000000)
+    def ticks_diff(a, b) :
+        return a - b
+    def ticks_add(a, b) :
+        return a + b
 
 from libraries.logging.logging import *
 
-basicConfig(level=DEBUG)                 # Can be one of NOTSET, DEBUG, INFO, WARNING, ERROR, CRITICAL
-log = getLogger("microWebSrv")
+basicConfig(level=DEBUG, ring_size=64)  # Can be one of NOTSET, DEBUG, INFO, WARNING, ERROR, CRITICAL
+                                         # Records are kept unformatted until drain(), errors are written at once
+log = getLogger("microWebSrv")           # log.setLevel(INFO) turns the per request debug lines off for this module only
 
 # try:
 #     1/0
@@ -32,13 +53,524 @@ try :
 except :
     pass
 
+try :
+    import select
+except :
+    select = None
+
+try :
+    import uasyncio as asyncio
+except :
+    try :
+        import asyncio
+    except :
+        asyncio = None
+
 class MicroWebSrvRoute :
-    def __init__(self, route, method, func, routeArgNames, routeRegex) :
-        self.route         = route        
-        self.method        = method       
-        self.func          = func         
+    def __init__(self, route, method, func, routeArgNames, metricsSlot=0) :
+        self.route         = route
+        self.method        = method
+        self.func          = func
         self.routeArgNames = routeArgNames
-        self.routeRegex    = routeRegex   
+        self.metricsSlot   = metricsSlot    # Index of the route in MicroWebSrvMetrics
+
+
+class MicroWebSrvStaticFile :
+    """
+    A static file held in the MicroWebSrv static file cache. The status line and headers of a 200 response are encoded
+    once, and the content is kept in RAM as well for files up to StaticCacheMaxFileSize octets.
+    """
+    def __init__(self, physPath, size, mtime, contentType, encoding=None) :
+        self.physPath    = physPath
+        self.size        = size
+        self.mtime       = mtime
+        self.contentType = contentType
+        self.encoding    = encoding     # 'gzip' for a pre-compressed '.gz' sibling file
+        self.etag        = '"%x-%x"' % (mtime, size)
+        self.headers     = None     # Encoded 200 status line and headers, without the Connection header
+        self.content     = None     # File content if small enough to be kept in RAM
+        self.cacheLevel  = None     # LetCacheStaticContentLevel the headers were built for
+        self.cost        = 0        # Octets of RAM used by this entry in the cache
+
+
+class MicroWebSrvTemplate :
+    """
+    A page split once, when it is created, into encoded static fragments and the '%s' slots between them. A response is
+    written as the fragments interleaved with the encoded slot values, so serving the page only allocates the value
+    strings and never builds or encodes the whole page. '%%' stands for a literal '%'.
+
+    Example:
+        page = MicroWebSrvTemplate("<html><body>Temperature: %s, Humidity: %s</body></html>")
+        httpResponse.WriteResponseTemplate(page, (21.5, 40.2))
+    """
+    def __init__(self, text, encoding='UTF-8') :
+        pieces          = text.split('%s')
+        self.fragments  = tuple(p.replace('%%', '%').encode(encoding) for p in pieces)
+        self.staticLen  = sum(len(f) for f in self.fragments)
+        self.slotsCount = len(pieces) - 1
+        self.encoding   = encoding
+
+    def Parts(self, values) :
+        """
+        Returns the fragments interleaved with the encoded 'values' as a tuple of bytes, and their total length.
+        """
+        if len(values) != self.slotsCount :
+            raise ValueError("Template has %d slots, %d values given" % (self.slotsCount, len(values)))
+        frags   = self.fragments
+        encoded = tuple( v if isinstance(v, bytes) else (v if isinstance(v, str) else str(v)).encode(self.encoding)
+                         for v in values )
+        length  = self.staticLen
+        parts   = [ frags[0] ]
+        for i in range(self.slotsCount) :
+            parts.append(encoded[i])
+            parts.append(frags[i+1])
+            length += len(encoded[i])
+        return tuple(parts), length
+
+
+class MicroWebSrvRouteNode :
+    """
+    A node of the segment trie used to dispatch routes with '<arg>' parts. Each URL path segment either follows a static
+    child by name or the single argument child, which matches any segment made of word characters.
+    """
+    def __init__(self) :
+        self.children = { }         # static segment -> MicroWebSrvRouteNode
+        self.argChild = None        # MicroWebSrvRouteNode for an '<arg>' segment
+        self.routes   = { }         # HTTP method -> MicroWebSrvRoute ending on this node
+
+
+class MicroWebSrvMetrics :
+    """
+    Request metrics of the server, kept per route: requests, errors (5xx responses), octets sent and a latency histogram
+    with fixed buckets. Every route owns a slot in arrays allocated up front, so recording a request only updates numbers
+    in place. Slot STATIC counts GET requests for the web folder, 404s included, UNMATCHED the requests that could not be
+    parsed or had no route for their method, METRICS the metrics page.
+    Worker threads update the arrays without a lock, a lost increment is acceptable for metrics.
+    """
+    STATIC    = 0
+    UNMATCHED = 1
+    METRICS   = 2
+
+    Buckets = (1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000, 2500000)    # Latency bounds, us
+
+    def __init__(self, labels) :
+        n             = len(labels)
+        self.labels   = labels                              # (route, method) of each slot
+        self.requests = array('L', [0] * n)
+        self.errors   = array('L', [0] * n)
+        self.sent     = [0] * n                             # Totals outgrow 32 bits, they stay Python ints
+        self.duration = [0] * n                             # Sum of latencies in us
+        self.hist     = array('L', [0] * (n * (len(self.Buckets) + 1)))
+
+    def record(self, slot, status, sent, us) :
+        self.requests[slot] += 1
+        if status >= 500 :
+            self.errors[slot] += 1
+        self.sent[slot]     += sent
+        self.duration[slot] += us
+        buckets = self.Buckets
+        n = len(buckets)
+        i = 0
+        while i < n and us > buckets[i] :
+            i += 1
+        self.hist[slot * (n + 1) + i] += 1
+
+    def prometheusLines(self, workerStats=None) :
+        """
+        Generates the metrics in the Prometheus text exposition format, one line at a time.
+        """
+        n = len(self.Buckets)
+        labels = [ 'route="%s",method="%s"' % (route.replace('\\', '\\\\').replace('"', '\\"'), method)
+                   for route, method in self.labels ]
+        yield "# HELP microwebsrv_requests_total Requests served.\n# TYPE microwebsrv_requests_total counter\n"
+        for slot, label in enumerate(labels) :
+            yield "microwebsrv_requests_total{%s} %d\n" % (label, self.requests[slot])
+        yield "# HELP microwebsrv_errors_total Requests answered with a 5xx status.\n# TYPE microwebsrv_errors_total counter\n"
+        for slot, label in enumerate(labels) :
+            yield "microwebsrv_errors_total{%s} %d\n" % (label, self.errors[slot])
+        yield "# HELP microwebsrv_sent_bytes_total Octets sent in responses.\n# TYPE microwebsrv_sent_bytes_total counter\n"
+        for slot, label in enumerate(labels) :
+            yield "microwebsrv_sent_bytes_total{%s} %d\n" % (label, self.sent[slot])
+        yield "# HELP microwebsrv_request_duration_seconds Time to read, handle and answer a request.\n" \
+              "# TYPE microwebsrv_request_duration_seconds histogram\n"
+        for slot, label in enumerate(labels) :
+            count = 0
+            for i in range(n + 1) :
+                count += self.hist[slot * (n + 1) + i]
+                le     = "%g" % (self.Buckets[i] / 1000000) if i < n else "+Inf"
+                yield "microwebsrv_request_duration_seconds_bucket{%s,le=\"%s\"} %d\n" % (label, le, count)
+            yield "microwebsrv_request_duration_seconds_sum{%s} %g\n" % (label, self.duration[slot] / 1000000)
+            yield "microwebsrv_request_duration_seconds_count{%s} %d\n" % (label, count)
+        if workerStats and workerStats['workers'] :
+            for name, key in (('workers', 'workers'), ('busy', 'busy'), ('queued', 'queued'), ('queue_depth', 'queueDepth')) :
+                yield "# TYPE microwebsrv_pool_%s gauge\nmicrowebsrv_pool_%s %d\n" % (name, name, workerStats[key])
+            for name in ('dispatched', 'rejected') :
+                yield "# TYPE microwebsrv_pool_%s_total counter\nmicrowebsrv_pool_%s_total %d\n" % (name, name, workerStats[name])
+
+
+class MicroWebSrvEventSource :
+    """
+    Pushes Server-Sent Events to any number of browsers. A single sampler calls SampleFunc every IntervalSec, encodes its
+    result once as a 'data:' event (JSON unless it is a str) and writes those same octets to every subscriber, only when
+    the reading has changed. A comment line is sent instead after KeepAliveSec without events, so dead connections are
+    noticed and dropped. The sampler only runs while there are subscribers: as a thread, or as a task of the event loop
+    when the server runs in async mode. Subscribed connections are handed over from the server, like web sockets, so
+    they do not hold up a server thread.
+
+    Example:
+        events = MicroWebSrvEventSource(lambda : { 'lux' : sensor.lux() }, intervalSec=1)
+
+        @MicroWebSrv.route('/events')
+        def _httpHandlerEvents(httpClient, httpResponse) :
+            return events.Accept(httpClient, httpResponse)
+    """
+    def __init__(self, sampleFunc, intervalSec=1, keepAliveSec=15, maxClients=8, event=None) :
+        self.SampleFunc   = sampleFunc
+        self.IntervalSec  = intervalSec
+        self.KeepAliveSec = keepAliveSec
+        self.MaxClients   = maxClients
+        self.Event        = event       # SSE event name, None sends unnamed 'message' events
+        self._clients     = [ ]         # Threaded MicroWebSrv._client subscribers
+        self._asyncCount  = 0           # Async subscribers, each served by its own task
+        self._lock        = allocate_lock()
+        self._running     = False
+        self._stalled     = { }         # id() of a subscriber whose socket was not writable -> seconds it has been skipped
+        self._last        = None        # Octets of the last event, sent first to new subscribers
+        self._lastValue   = None
+        self._idleSec     = 0
+        self._asyncEvent  = None        # Set by the async sampler whenever _asyncData is to be sent
+        self._asyncData   = None
+
+    def Accept(self, httpClient, httpResponse) :
+        """
+        Subscribes the client of a route handler to the events, the handler must return what this returns.
+        """
+        if len(self._clients) + self._asyncCount >= self.MaxClients :
+            return httpResponse.WriteResponseError(503)
+        httpClient._keepAlive = False                           # The event stream lasts until the connection is closed
+        head = httpResponse._headParts(200, { 'Cache-Control' : 'no-cache' }, 'text/event-stream', None, None)
+        if httpClient._isAsync :
+            httpResponse._writeParts(head + (self._last, ))
+            return self._serveAsync(httpClient)
+        with self._lock :
+            httpResponse._writeParts(head + (self._last, ))
+            if httpClient._socketfile is not httpClient._socket :
+                httpClient._socketfile.flush()
+            self._clients.append(httpClient)
+            if not self._running :
+                self._running = MicroWebSrv._startThread(self._run)
+        return MicroWebSrv._client._UPGRADED
+
+    def ClientsCount(self) :
+        return len(self._clients) + self._asyncCount
+
+    def _sample(self) :
+        """
+        Reads SampleFunc and returns the event to send to every subscriber: new data, a keep alive comment or 'None'.
+        """
+        try :
+            value = self.SampleFunc()
+        except Exception as e :
+            log.debug("Event source sample failed: %s", e)
+            value = self._lastValue
+        self._idleSec += self.IntervalSec
+        if value != self._lastValue or self._last is None :
+            self._lastValue = value
+            data = value if isinstance(value, str) else dumps(value)
+            data = ''.join("data: %s\n" % line for line in data.split('\n')) + "\n"
+            if self.Event :
+                data = "event: %s\n" % self.Event + data
+            self._last    = data.encode()
+            self._idleSec = 0
+            return self._last
+        if self._idleSec >= self.KeepAliveSec :
+            self._idleSec = 0
+            return b":\n\n"
+        return None
+
+    def _run(self) :
+        """
+        Writes each event outside of the lock, and only to the subscribers whose socket polls as writable, so a stalled
+        browser never holds up the others or Accept(). A skipped subscriber gets the latest event once it is writable
+        again, and is dropped after KeepAliveSec without being writable.
+        """
+        poller = select.poll() if select else None
+        while True :
+            with self._lock :
+                if not self._clients :
+                    self._running = False
+                    return
+                clients = list(self._clients)
+            data = self._sample()
+            for client in clients :
+                key  = id(client)
+                skip = self._stalled.get(key)
+                out  = self._last if skip is not None else data     # The latest event covers the ones it missed
+                if not out :
+                    continue
+                if self._isWritable(poller, client._socket) :
+                    try :
+                        client._socketfile.write(out)
+                        if client._socketfile is not client._socket :
+                            client._socketfile.flush()
+                        self._stalled.pop(key, None)
+                        continue
+                    except :
+                        pass
+                elif (skip or 0) + self.IntervalSec < self.KeepAliveSec :
+                    self._stalled[key] = (skip or 0) + self.IntervalSec
+                    continue
+                with self._lock :
+                    self._clients.remove(client)
+                self._stalled.pop(key, None)
+                self._closeClient(client)
+            sleep(self.IntervalSec)
+
+    @staticmethod
+    def _isWritable(poller, sock) :
+        if poller is None :
+            return True                                         # No poll support, the socket timeout bounds each write
+        try :
+            poller.register(sock, select.POLLOUT)
+            events = poller.poll(0)
+            poller.unregister(sock)
+        except :
+            return False
+        return any(ev & select.POLLOUT for obj, ev in events)
+
+    @staticmethod
+    def _closeClient(client) :
+        try :
+            if client._socketfile is not client._socket :
+                client._socketfile.close()
+            client._socket.close()
+        except :
+            pass
+
+    async def _runAsync(self) :
+        while self._asyncCount :
+            data = self._sample()
+            if data :
+                self._asyncData = data
+                self._asyncEvent.set()
+                self._asyncEvent.clear()
+            await asyncio.sleep(self.IntervalSec)
+        self._asyncEvent = None
+
+    async def _serveAsync(self, client) :
+        writer = client._writer
+        self._asyncCount += 1
+        try :
+            await client._drain()
+            if self._asyncEvent is None :
+                self._asyncEvent = asyncio.Event()
+                asyncio.create_task(self._runAsync())
+            event = self._asyncEvent
+            while True :
+                await event.wait()
+                writer.write(self._asyncData)
+                await writer.drain()
+        except Exception as e :
+            log.debug("Event stream to %s closed: %s", client._addr, e)
+        finally :
+            self._asyncCount -= 1
+
+
+class MicroWebSrvBroadcastHub :
+    """
+    Fans binary frames out to every connected web socket. Every client has its own queue of at most QueueLen frames;
+    when a client cannot keep up its oldest frames are dropped, so a slow phone only loses stale frames and never holds
+    up the sampling or the other clients. A single thread calls SampleFunc every IntervalSec, broadcasts the frames it
+    returns, and sends queued frames only to the sockets that poll as writable. It runs while clients are connected.
+    Web socket sends are not thread safe, so any other message to a client of the hub, such as a reply from its
+    RecvTextCallback, must go through Send() to not interleave with the broadcast frames on the wire.
+
+    Example, from the AcceptWebSocketCallback of the server:
+        hub = MicroWebSrvBroadcastHub(lambda : [ struct.pack('<f', sensor.lux()) ], intervalSec=1)
+
+        def acceptWebSocketCallback(webSocket, httpClient) :
+            webSocket.ClosedCallback = hub.Remove
+            hub.Add(webSocket, httpClient)
+    """
+    def __init__(self, sampleFunc=None, intervalSec=1, queueLen=8, maxClients=4) :
+        self.SampleFunc  = sampleFunc   # Returns a list of frames (bytes) to broadcast, or None
+        self.IntervalSec = intervalSec
+        self.QueueLen    = queueLen
+        self.MaxClients  = maxClients
+        self.Dropped     = 0            # Frames dropped over all clients because their queue was full
+        self._clients    = [ ]          # [webSocket, socket, queue of frames, send lock]
+        self._lock       = allocate_lock()
+        self._running    = False
+
+    def Add(self, webSocket, httpClient) :
+        """
+        Starts broadcasting to an accepted web socket. Returns 'False' and closes it if MaxClients are connected.
+        """
+        with self._lock :
+            if len(self._clients) >= self.MaxClients :
+                full = True
+            else :
+                full = False
+                self._clients.append([webSocket, httpClient._socket, [ ], allocate_lock()])
+                if not self._running :
+                    self._running = MicroWebSrv._startThread(self._run)
+        if full :
+            try :
+                webSocket.Close()
+            except :
+                pass
+            return False
+        return True
+
+    def Remove(self, webSocket) :
+        with self._lock :
+            for client in self._clients :
+                if client[0] is webSocket :
+                    self._clients.remove(client)
+                    break
+
+    def ClientsCount(self) :
+        return len(self._clients)
+
+    def Send(self, webSocket, msg) :
+        """
+        Sends a text (str) or binary message to one web socket, never at the same time as a broadcast frame to it.
+        """
+        lock = None
+        with self._lock :
+            for client in self._clients :
+                if client[0] is webSocket :
+                    lock = client[3]
+                    break
+        if lock is None :
+            return self._send(webSocket, msg)
+        with lock :
+            return self._send(webSocket, msg)
+
+    @staticmethod
+    def _send(webSocket, msg) :
+        if isinstance(msg, str) :
+            return webSocket.SendText(msg)
+        return webSocket.SendBinary(msg)
+
+    def Broadcast(self, frame) :
+        """
+        Queues a frame for every client without ever blocking; a full queue drops its oldest frame.
+        """
+        with self._lock :
+            for client in self._clients :
+                queue = client[2]
+                if len(queue) >= self.QueueLen :
+                    queue.pop(0)
+                    self.Dropped += 1
+                queue.append(frame)
+
+    def _run(self) :
+        poller   = select.poll() if select else None
+        nextTime = ticks_us()
+        while True :
+            with self._lock :
+                if not self._clients :
+                    self._running = False
+                    return
+            if ticks_diff(nextTime, ticks_us()) <= 0 :
+                nextTime = ticks_add(ticks_us(), int(self.IntervalSec * 1000000))
+                if self.SampleFunc :
+                    try :
+                        for frame in self.SampleFunc() or () :
+                            self.Broadcast(frame)
+                    except Exception as e :
+                        log.debug("Broadcast hub sample failed: %s", e)
+            waitMs = max(min(ticks_diff(nextTime, ticks_us()) // 1000, 100), 0)
+            for client in self._writableClients(poller, waitMs) :
+                with self._lock :
+                    frame = client[2].pop(0) if client[2] else None
+                if frame :
+                    try :
+                        with client[3] :
+                            client[0].SendBinary(frame)
+                        closed = client[0].IsClosed()
+                    except :
+                        closed = True
+                    if closed :
+                        self.Remove(client[0])
+
+    def _writableClients(self, poller, waitMs) :
+        """
+        Waits up to waitMs for the sockets with queued frames to be writable and returns their clients.
+        """
+        with self._lock :
+            pending = [ client for client in self._clients if client[2] ]
+        if not pending :
+            sleep(waitMs / 1000)
+            return pending
+        if poller is None :
+            return pending                                      # No poll support, the socket timeout bounds each send
+        byKey = { }
+        for client in pending :
+            poller.register(client[1], select.POLLOUT)
+            byKey[id(client[1])] = client
+            fd = MicroWebSrv._fileno(client[1])
+            if fd is not None :
+                byKey[fd] = client
+        events = poller.poll(waitMs)
+        for client in pending :
+            try :
+                poller.unregister(client[1])
+            except :
+                pass
+        return [ byKey[obj if isinstance(obj, int) else id(obj)] for obj, ev in events
+                 if ev & select.POLLOUT and (obj if isinstance(obj, int) else id(obj)) in byKey ]
+
+
+class MicroWebSrvWorkQueue :
+    """
+    The bounded hand-off queue between the accept loop and the worker threads. Put never blocks: a full queue refuses the
+    item so the accept loop can shed the connection at once. Only _thread locks are used, as they are all MicroPython has.
+    """
+    def __init__(self, depth) :
+        self.depth      = depth
+        self.busy       = 0         # Workers currently serving a connection
+        self.maxQueued  = 0         # Highest queue depth seen
+        self.dispatched = 0         # Connections handed to the workers
+        self.rejected   = 0         # Connections refused because the queue was full
+        self._items     = [ ]
+        self._lock      = allocate_lock()
+        self._ready     = allocate_lock()   # Held while the queue is empty, released to wake one worker
+        self._ready.acquire()
+
+    def put(self, item, force=False) :
+        with self._lock :
+            if len(self._items) >= self.depth and not force :
+                self.rejected += 1
+                return False
+            self._items.append(item)
+            if item is not None :
+                self.dispatched += 1
+            if len(self._items) > self.maxQueued :
+                self.maxQueued = len(self._items)
+            if self._ready.locked() :
+                self._ready.release()
+        return True
+
+    def get(self) :
+        while True :
+            self._ready.acquire()               # Blocks until something is queued
+            with self._lock :
+                if self._items :
+                    item = self._items.pop(0)
+                    if self._items and self._ready.locked() :
+                        self._ready.release()   # Wake the next worker
+                    if item is not None :
+                        self.busy += 1
+                    return item
+
+    def done(self) :
+        with self._lock :
+            self.busy -= 1
+
+    def pending(self) :
+        return len(self._items)
 
 
 class MicroWebSrv :
@@ -86,6 +618,17 @@ class MicroWebSrv :
 
     _pyhtmlPagesExt = '.pyhtml'
 
+    _serverName   = "MicroWebSrv by JC`zic"
+    _serverHeader = ("Server: %s\r\n" % _serverName).encode()
+    _closeHeader  = b"Connection: close\r\n"
+
+    _clientTimeoutSec = 4
+
+    _routeArgRegex = re.compile('\\w*$')
+
+    _httpDays   = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+    _httpMonths = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
     # ============================================================================
     # ===( Class globals  )=======================================================
     # ============================================================================
@@ -155,6 +698,96 @@ class MicroWebSrv :
 
     # ------------------------------------------------------------------------------
 
+    @staticmethod
+    def _parseURLEncoded(s):
+        res = { }
+        for param in s.split('&') :
+            if param :
+                param = param.split('=', 1)
+                value = MicroWebSrv._unquote(param[1]) if len(param) > 1 else ''
+                res[MicroWebSrv._unquote(param[0])] = value
+        return res
+
+    # ------------------------------------------------------------------------------
+
+    @staticmethod
+    def _fileStat(path):
+        try :
+            return stat(path)
+        except :
+            return None
+
+    # ----------------------------------------------------------------------------
+
+    @staticmethod
+    def _httpDate(secs):
+        t = gmtime(secs)
+        return "%s, %02d %s %04d %02d:%02d:%02d GMT" % ( MicroWebSrv._httpDays[t[6]], t[2],
+                                                         MicroWebSrv._httpMonths[t[1]-1], t[0], t[3], t[4], t[5] )
+
+    # ----------------------------------------------------------------------------
+
+    @staticmethod
+    def _createSSLContext(sslOptions):
+        """
+        Loads the key and certificate of 'sslOptions' once into a server SSLContext that wraps every connection, instead
+        of parsing them again for each handshake. On CPython the context also holds the OpenSSL session cache and issues
+        session tickets, so a returning client resumes its session and skips the RSA operation. The mbedtls context of
+        MicroPython has no server session cache, there only the parsing is saved.
+
+        :param sslOptions: dict with 'key' and 'cert' as DER or PEM bytes or file names, or with a ready 'context'
+        :return: SSLContext, or None if this port has none and connections must go through ssl.wrap_socket()
+        """
+        if 'context' in sslOptions :
+            return sslOptions['context']
+        if not hasattr(ssl, 'SSLContext') :
+            return None
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        cert, key = sslOptions['cert'], sslOptions['key']
+        if sys.implementation.name == 'micropython' :
+            ctx.load_cert_chain(cert, key)      # MicroPython takes the DER or PEM data itself
+            return ctx
+        import os, tempfile
+        temps = [ ]
+        try :
+            for data in (cert, key) :
+                if isinstance(data, (bytes, bytearray)) :
+                    fd, path = tempfile.mkstemp(suffix='.pem')
+                    with os.fdopen(fd, 'wb') as f :
+                        f.write(MicroWebSrv._toPEM(bytes(data)))
+                    temps.append(path)
+            ctx.load_cert_chain( temps[0] if isinstance(cert, (bytes, bytearray)) else cert,
+                                 temps[-1] if isinstance(key, (bytes, bytearray)) else key )
+        finally :
+            for path in temps :
+                os.remove(path)
+        return ctx
+
+    # ----------------------------------------------------------------------------
+
+    @staticmethod
+    def _toPEM(data):
+        """
+        CPython only loads PEM files, so DER blobs as given to MicroPython are wrapped in the matching PEM armour.
+        """
+        if data.startswith(b'-----') :
+            return data
+        from binascii import b2a_base64
+        hdr = 2 + (data[1] & 0x7F if data[1] & 0x80 else 0)     # Skips the tag and length of the outer SEQUENCE
+        if data[hdr:hdr+2] != b'\x02\x01' :
+            label = b'CERTIFICATE'
+        elif data[hdr+3] == 0x30 :
+            label = b'PRIVATE KEY'          # PKCS#8, an AlgorithmIdentifier follows the version
+        elif data[hdr+2] == 1 :
+            label = b'EC PRIVATE KEY'
+        else :
+            label = b'RSA PRIVATE KEY'
+        b64 = b2a_base64(data).replace(b'\n', b'')
+        lines = [ b64[i:i+64] for i in range(0, len(b64), 64) ]
+        return b'-----BEGIN ' + label + b'-----\n' + b'\n'.join(lines) + b'\n-----END ' + label + b'-----\n'
+
+    # ----------------------------------------------------------------------------
+
     @staticmethod
     def _fileExists(path):
         """A private helper method to find out if a directory path exists.
@@ -176,6 +809,15 @@ class MicroWebSrv :
 
     # ----------------------------------------------------------------------------
 
+    @staticmethod
+    def _fileno(sock):
+        try :
+            return sock.fileno()
+        except :
+            return None
+
+    # ----------------------------------------------------------------------------
+
     @staticmethod
     def _isPyHTMLFile(filename):
         """
@@ -202,38 +844,101 @@ class MicroWebSrv :
         self._webPath       = webPath
         self._notFoundUrl   = None
         self._started       = False
+        self._sslOptions    = sslOptions
+        self._asyncServer   = None
+        self._asyncLoop     = None
 
         self.MaxWebSocketRecvLen        = 1024
+        self.KeepAliveMaxRequests       = 100       # Requests served on one connection before it is closed, 1 disables keep-alive
+        self.KeepAliveTimeoutSec        = 3         # Time an idle kept alive connection waits for its next request
         self.WebSocketThreaded          = True
         self.AcceptWebSocketCallback    = None
         self.LetCacheStaticContentLevel = 2
-
+        self.StaticCacheMaxBytes        = 16 * 1024 # RAM used by the static file cache, 0 disables it
+        self.StaticCacheMaxFileSize     = 4 * 1024  # Larger files only have their headers cached and are streamed from flash
+        self.GzipStaticContent          = True      # Serve 'file.gz' for 'file' to clients accepting gzip, if it exists
+        self.SendBufferSize             = 1024      # Chunk size used to stream files, larger is faster if RAM allows
+        self._sendBuf                   = None      # Reused by every file response, see _getSendBuffer
+        self.ListenBacklog              = 5         # Connections the network stack queues while the server is busy
+        self.WorkerThreads              = 0         # Threads serving connections in parallel, 0 serves them on the accept thread
+        self.WorkerQueueDepth           = 4         # Accepted connections waiting for a worker before new ones get a 503
+        self._workQueue                 = None
+        self.MaxRequestLineLength       = 1024      # Longest request line or kept header line, longer ones get a 414 or 431
+        self.MaxRequestHeaders          = 32        # Header lines allowed in a request, more get a 431
+        self.MaxRequestContentLength    = 16 * 1024 # Largest request content received in async mode, more gets a 413
+        self.KeepRequestHeaders         = set(( 'host', 'connection', 'upgrade', 'accept-encoding',
+                                                'if-none-match', 'if-modified-since', 'range', 'if-range',
+                                                'sec-websocket-key',
+                                                'sec-websocket-version', 'sec-websocket-protocol' ))
+                                                    # Headers kept for the server and handlers, None keeps them all
+        self._keptHeaderNames           = (None, 0, None)
+        self.CollectMetrics             = True      # Record per route request metrics
+        self.MetricsUrl                 = '/metrics'    # Page serving the metrics in Prometheus format, None disables it
+        self._overloadResponse          = None
+        self._keepAliveHeader           = (None, None)
+
+        self._staticCache      = { }                # URL path -> MicroWebSrvStaticFile
+        self._staticCacheOrder = [ ]                # URL paths, least recently used first
+        self._staticCacheBytes = 0
+        self._staticCacheLock  = allocate_lock()    # Worker threads share the cache
+        self._staticGzipMisses = { }                # URL path without a 'file.gz' -> modification time of the file
+
+        self._sslContext = None
         if sslOptions is not None:
+            try :
+                self._sslContext = MicroWebSrv._createSSLContext(sslOptions)
+            except Exception as ex :
+                log.warning("Could not create an SSL context, wrapping each connection instead: %s", ex)
+        if self._sslContext is not None:
+            self._wrapSocket = lambda s, ctx=self._sslContext: ctx.wrap_socket(s, server_side=True)
+        elif sslOptions is not None:
             self._wrapSocket = lambda s: ssl.wrap_socket(s, server_side=True, **sslOptions)
         else:
             self._wrapSocket = lambda s: s
 
         self._routeHandlers = []
-        routeHandlers += self._docoratedRouteHandlers
-        for route, method, func in routeHandlers :
+        self._staticRoutes  = { }                       # (method, path) -> MicroWebSrvRoute for routes without arguments
+        self._routeTrie     = MicroWebSrvRouteNode()    # Segment trie for routes with '<arg>' parts
+        metricsLabels       = [ ('<static>', 'GET'), ('<unmatched>', ''), ('<metrics>', 'GET') ]
+        for route, method, func in routeHandlers + self._docoratedRouteHandlers :
             routeParts = route.split('/')
             # -> ['', 'users', '<uID>', 'addresses', '<addrID>', 'test', '<anotherID>']
             routeArgNames = []
-            routeRegex    = ''
+            segments      = []
             for s in routeParts :
                 if s.startswith('<') and s.endswith('>') :
                     routeArgNames.append(s[1:-1])
-                    routeRegex += '/(\\w*)'
+                    segments.append(None)
                 elif s :
-                    routeRegex += '/' + s
-            routeRegex += '$'
-            # -> '/users/(\w*)/addresses/(\w*)/test/(\w*)$'
-            routeRegex = re.compile(routeRegex)
-
-            self._routeHandlers.append(MicroWebSrvRoute(route, method, func, routeArgNames, routeRegex))
+                    segments.append(s)
+            # -> ['users', None, 'addresses', None, 'test', None]
+            rh = MicroWebSrvRoute(route, method, func, routeArgNames, len(metricsLabels))
+            metricsLabels.append((route, method))
+            self._routeHandlers.append(rh)
+            if routeArgNames :
+                node = self._routeTrie
+                for seg in segments :
+                    if seg is None :
+                        if node.argChild is None :
+                            node.argChild = MicroWebSrvRouteNode()
+                        node = node.argChild
+                    else :
+                        if seg not in node.children :
+                            node.children[seg] = MicroWebSrvRouteNode()
+                        node = node.children[seg]
+                if method not in node.routes :          # First registered route wins, as with the former linear scan
+                    node.routes[method] = rh
+            else :
+                key = (method, ''.join('/' + seg for seg in segments))
+                if key not in self._staticRoutes :
+                    self._staticRoutes[key] = rh
 
+        self._metrics   = MicroWebSrvMetrics(metricsLabels)
         self._boardType = uname()[4].split()[0]      # Provides the name of the actual board being used
 
+        for code in (400, 403, 404, 405, 500, 501, 503) :
+            MicroWebSrv._response._cannedError(code)    # Render the common error pages once, up front
+
     # ============================================================================
     # ===( Server Process )=======================================================
     # ============================================================================
@@ -241,41 +946,209 @@ class MicroWebSrv :
     def _serverProcess(self):
         self._started = True
         log.debug("Server Process is now started. About to accept SOCKET incoming connections")
+        queue = self._workQueue
         while True :
             try :
                 client, cliAddr = self._server.accept()         # Blocking on socket.accept()
-                client.settimeout(4)
-                client = self._wrapSocket(client)
-                log.info("Accepted 'client': %s and 'client address': %s", client, cliAddr)
             except Exception as ex :
-                if ex.args and ex.args[0] == 113 :
+                if ex.args and ex.args[0] in (9, 113) :         # EBADF, ECONNABORTED: the server socket was closed by Stop()
                     break
                 continue
-            self._client(self, client, cliAddr)                 # Calling _client to process request.
+            try :
+                client.settimeout(self._clientTimeoutSec)
+                if queue is None :
+                    client = self._wrapSocket(client)
+                if log.isEnabledFor(INFO) :
+                    log.info("Accepted 'client': %s and 'client address': %s", client, cliAddr)
+            except Exception as ex :
+                log.debug("Problem accepting client %s: %s", cliAddr, ex)   # Failed TLS handshake, the socket is not kept
+                try :
+                    client.close()
+                except :
+                    pass
+                continue
+            if queue is None :
+                self._client(self, client, cliAddr)             # Calling _client to process request.
+            elif not queue.put((client, cliAddr)) :
+                self._rejectClient(client)
+        if queue is not None :
+            for i in range(self.WorkerThreads) :
+                queue.put(None, True)                           # Tells each worker to exit
+            self._workQueue = None
         self._started = False
 
+    # ----------------------------------------------------------------------------
+
+    def _workerProcess(self, queue):
+        """
+        The body of each worker thread. Serves the connections handed over by the accept loop, one at a time, until Stop()
+        queues 'None'. Every worker owns its send buffer since the buffer of the server is not safe to share.
+        """
+        sendBuf = memoryview(bytearray(self.SendBufferSize))
+        while True :
+            item = queue.get()
+            if item is None :
+                break
+            client, cliAddr = item
+            try :
+                self._client(self, self._wrapSocket(client), cliAddr, sendBuf)
+            except Exception as ex :
+                log.debug("Problem serving client %s: %s", cliAddr, ex)
+                try :
+                    client.close()
+                except :
+                    pass
+            queue.done()
+
+    # ----------------------------------------------------------------------------
+
+    def _rejectClient(self, client):
+        """
+        Sheds a connection the workers have no room for with an immediate '503 Service Unavailable', without reading the
+        request. HTTPS connections are just closed, a TLS handshake would cost more than serving the request.
+        """
+        try :
+            if self._sslOptions is None :
+                if self._overloadResponse is None :
+                    head, content = MicroWebSrv._response._cannedError(503)
+                    self._overloadResponse = head + b"Retry-After: 1\r\n" + MicroWebSrv._closeHeader + b"\r\n" + content
+                client.settimeout(0)
+                try :
+                    client.recv(1024)       # Unread request octets make close() reset the connection before the client reads the 503
+                except :
+                    pass
+                client.settimeout(self._clientTimeoutSec)
+                if hasattr(client, 'sendall') :
+                    client.sendall(self._overloadResponse)
+                else :
+                    client.write(self._overloadResponse)
+        except :
+            pass
+        try :
+            client.close()
+        except :
+            pass
+        log.info("Server busy, connection rejected")
+
+    # ----------------------------------------------------------------------------
+
+    def GetWorkerStats(self):
+        """
+        Returns the counters of the worker pool, all 0 if the server runs without workers:
+            workers    - worker threads
+            busy       - workers serving a connection right now
+            queued     - accepted connections waiting for a worker
+            queueDepth - queued connections allowed before new ones are rejected
+            maxQueued  - highest number of queued connections seen
+            dispatched - connections handed to the workers
+            rejected   - connections answered with a 503 because the queue was full
+
+        :return: dict
+        """
+        queue = self._workQueue
+        if queue is None :
+            return { 'workers' : 0, 'busy' : 0, 'queued' : 0, 'queueDepth' : 0,
+                     'maxQueued' : 0, 'dispatched' : 0, 'rejected' : 0 }
+        return { 'workers'    : self.WorkerThreads,
+                 'busy'       : queue.busy,
+                 'queued'     : queue.pending(),
+                 'queueDepth' : queue.depth,
+                 'maxQueued'  : queue.maxQueued,
+                 'dispatched' : queue.dispatched,
+                 'rejected'   : queue.rejected }
+
+    # ----------------------------------------------------------------------------
+
+    def _asyncServerThread(self):
+        """
+        Runs the cooperative server until it is stopped. Used by Start(mode='async') either inline or as the body of the
+        server thread.
+        """
+        try :
+            asyncio.run(self._asyncServerProcess())
+        except Exception as e :
+            log.exc(e, "Async server process stopped unexpectedly")
+        self._asyncServer = None
+        self._started     = False
+
+    # ----------------------------------------------------------------------------
+
+    async def _asyncServerProcess(self):
+        if self._sslContext is not None :
+            self._asyncServer = await asyncio.start_server( self._asyncClientProcess,
+                                                            self._srvAddr[0],
+                                                            self._srvAddr[1],
+                                                            backlog = self.ListenBacklog,
+                                                            ssl     = self._sslContext )
+        else :
+            self._asyncServer = await asyncio.start_server( self._asyncClientProcess,
+                                                            self._srvAddr[0],
+                                                            self._srvAddr[1],
+                                                            backlog = self.ListenBacklog )
+        self._asyncLoop = asyncio.get_event_loop()
+        self._started   = True
+        log.debug("Async server process is now started. Serving SOCKET connections from the event loop")
+        await self._asyncServer.wait_closed()
+
+    # ----------------------------------------------------------------------------
+
+    async def _asyncClientProcess(self, reader, writer):
+        """
+        Called by the event loop for every accepted connection. Each connection is served by its own task so a slow client
+        only ever waits on its own socket.
+        """
+        cliAddr = writer.get_extra_info('peername')
+        if log.isEnabledFor(INFO) :
+            log.info("Accepted async client address: %s", cliAddr)
+        await MicroWebSrv._asyncClient(self, reader, writer, cliAddr)._processRequestAsync()
+
     # ============================================================================
     # ===( Functions )============================================================
     # ============================================================================
 
-    def Start(self, threaded=False):
+    def Start(self, threaded=False, mode=None):
         """
-        The main method to start the web server. Takes a single parameter 'threaded' which is defaulted to 'False'.
+        The main method to start the web server. Takes a parameter 'threaded' which is defaulted to 'False'.
         If threaded is false the method will use the private _serverProcess which is an endless while loop blocking on
         the socket.accept() method.
         If threaded is true the method will pass the private -serverProcess into the _startThread process to use the
         threading module. This allows the use of the repl when running the server.
+        If mode is 'async' the server is run on a (u)asyncio event loop instead, serving every connection as a separate
+        task so one slow client no longer blocks the others. Route handlers may then also be 'async def' functions.
+        The 'threaded' parameter still decides if the event loop runs in its own thread.
+        If WorkerThreads is set, that many worker threads serve the accepted connections in parallel. Up to
+        WorkerQueueDepth connections wait for a free worker; more are answered with a '503 Service Unavailable' at once.
+        Both are ignored in async mode. ListenBacklog sets the connections queued by the network stack in either mode.
 
         :param threaded:
+        :param mode: None | 'async'
         :return:
         """
+        if mode == 'async' :
+            if self._started or self._asyncServer :
+                return
+            if asyncio is None :
+                log.error("Async mode needs the (u)asyncio module which is not available on this port")
+                return
+            if self._sslOptions is not None and self._sslContext is None :
+                log.error("Async mode needs an SSL context for HTTPS which this port lacks, start the server without mode='async'")
+                return
+            if threaded :
+                MicroWebSrv._startThread(self._asyncServerThread)
+            else :
+                self._asyncServerThread()
+            return
         if not self._started :
             self._server = socket.socket()
             self._server.setsockopt( socket.SOL_SOCKET,
                                      socket.SO_REUSEADDR,
                                      1 )
             self._server.bind(self._srvAddr)
-            self._server.listen(1)
+            self._server.listen(self.ListenBacklog)
+            if self.WorkerThreads > 0 :
+                self._workQueue = MicroWebSrvWorkQueue(self.WorkerQueueDepth)
+                for i in range(self.WorkerThreads) :
+                    MicroWebSrv._startThread(self._workerProcess, (self._workQueue,))
             if threaded :
                 MicroWebSrv._startThread(self._serverProcess)
             else :
@@ -284,7 +1157,16 @@ class MicroWebSrv :
     # ----------------------------------------------------------------------------
 
     def Stop(self):
-        if self._started:
+        if self._asyncServer :
+            if hasattr(self._asyncLoop, 'call_soon_threadsafe') :      # CPython, Stop() is usually called from another thread
+                self._asyncLoop.call_soon_threadsafe(self._asyncServer.close)
+            else :
+                self._asyncServer.close()
+        elif self._started:
+            try :
+                self._server.shutdown(socket.SHUT_RDWR)     # CPython, close() alone does not wake a thread blocked in accept()
+            except :
+                pass
             self._server.close()
 
     # ----------------------------------------------------------------------------
@@ -308,51 +1190,81 @@ class MicroWebSrv :
         :param filename:
         :return: mimeType | None
         """
-        filename = filename.lower()
-        for ext in self._mimeTypes :
-            if filename.endswith(ext) :
-                return self._mimeTypes[ext]
-        return None
+        i = filename.rfind('.')
+        if i < 0 :
+            return None
+        return self._mimeTypes.get(filename[i:].lower())
 
     # ----------------------------------------------------------------------------
     
     def GetRouteHandler(self, resUrl, method):
         """
-        The method will take a HTTP method(POST,PUT, DELETE, GET) and URL path. It removes '/' at the end of a URL path. It then iterates around
-        the routehandlers that are configured upon creation (e.g. /test, /status, /myPath etc..) and checks to see if there is a handler for the
-        given resUrl.
+        The method will take a HTTP method(POST,PUT, DELETE, GET) and URL path. It removes '/' at the end of a URL path. It then looks
+        up the routehandlers that are configured upon creation (e.g. /test, /status, /myPath etc..) to see if there is a handler for the
+        given resUrl. Static routes are found with a single dictionary lookup, routes with arguments (e.g. /edit/<index>) by walking
+        the segment trie, so the cost depends on the number of path segments and not on the number of routes.
         If there is a match, the function that is attached to that route (e.g. path=/mypath: func=myURLfunction) will be passed back to the caller.
-        This is used
+        Arguments made only of digits are passed to the handler as integers.
 
         :param resUrl:
         :param method:
         :return: route handler function && args | None && None
         """
-        if self._routeHandlers :
-            #resUrl = resUrl.upper()
-            if resUrl.endswith('/') :
-                resUrl = resUrl[:-1]
-            method = method.upper()
-            for rh in self._routeHandlers :
-                if rh.method == method :
-                    m = rh.routeRegex.match(resUrl)
-                    if m :   # found matching route?
-                        if rh.routeArgNames :
-                            routeArgs = {}
-                            for i, name in enumerate(rh.routeArgNames) :
-                                value = m.group(i+1)
-                                try :
-                                    value = int(value)
-                                except :
-                                    pass
-                                routeArgs[name] = value
-                            return (rh.func, routeArgs)
-                        else :
-                            return (rh.func, None)
+        rh, routeArgs = self._getRoute(resUrl, method)
+        if rh :
+            return (rh.func, routeArgs)
+        return (None, None)
+
+    # ----------------------------------------------------------------------------
+
+    def _getRoute(self, resUrl, method):
+        if resUrl.endswith('/') :
+            resUrl = resUrl[:-1]
+        method = method.upper()
+        rh = self._staticRoutes.get((method, resUrl))
+        if rh :
+            return (rh, None)
+        if self._routeTrie.children or self._routeTrie.argChild :
+            if not resUrl.startswith('/') :
+                return (None, None)
+            segments = resUrl.split('/')
+            values   = []
+            rh = self._matchRouteNode(self._routeTrie, segments, 1, method, values)
+            if rh :
+                routeArgs = {}
+                for i, name in enumerate(rh.routeArgNames) :
+                    value = values[i]
+                    routeArgs[name] = int(value) if value.isdigit() else value
+                return (rh, routeArgs)
         return (None, None)
 
     # ----------------------------------------------------------------------------
 
+    def _matchRouteNode(self, node, segments, i, method, values):
+        """
+        Walks the route trie from 'node' for segments[i:]. Static segments are tried before an argument segment. The values
+        of the argument segments are collected in 'values'.
+
+        :return: MicroWebSrvRoute | None
+        """
+        if i == len(segments) :
+            return node.routes.get(method)
+        seg   = segments[i]
+        child = node.children.get(seg)
+        if child :
+            rh = self._matchRouteNode(child, segments, i+1, method, values)
+            if rh :
+                return rh
+        if node.argChild and self._routeArgRegex.match(seg) :
+            values.append(seg)
+            rh = self._matchRouteNode(node.argChild, segments, i+1, method, values)
+            if rh :
+                return rh
+            values.pop()
+        return None
+
+    # ----------------------------------------------------------------------------
+
     def _physPathFromURLPath(self, urlPath):
         """
         A private helper method to translate a URL path for a file resource to a physical path on the device.
@@ -364,153 +1276,552 @@ class MicroWebSrv :
         :param urlPath:
         :return: None | pysPath
         """
+        return self._physPathAndStatFromURLPath(urlPath)[0]
+
+    # ----------------------------------------------------------------------------
+
+    def _physPathAndStatFromURLPath(self, urlPath, suffix=''):
         if urlPath == '/' :
             for idxPage in self._indexPages :
-            	physPath = self._webPath + '/' + idxPage
-            	if MicroWebSrv._fileExists(physPath) :
-            		return physPath
+                physPath = self._webPath + '/' + idxPage + suffix
+                st = MicroWebSrv._fileStat(physPath)
+                if st :
+                    return (physPath, st)
         else :
-            physPath = self._webPath + urlPath
-            if MicroWebSrv._fileExists(physPath) :
-                return physPath
-        return None
+            physPath = self._webPath + urlPath + suffix
+            st = MicroWebSrv._fileStat(physPath)
+            if st :
+                return (physPath, st)
+        return (None, None)
+
+    # ----------------------------------------------------------------------------
+
+    def _getStaticFile(self, urlPath, gzip=False):
+        """
+        Returns the MicroWebSrvStaticFile for a URL path, or 'None' if there is no such file. Cached entries are checked with a
+        single stat of the file and dropped if its size or modification time changed, so a file updated on flash is never
+        served stale. The least recently used entries are evicted to keep the cache within StaticCacheMaxBytes.
+        If gzip is 'True' the pre-compressed 'file.gz' sibling of the file is returned if there is one, and the file
+        otherwise. A missing 'file.gz' is remembered until the modification time of the file changes, so serving the file
+        still takes a single stat.
+
+        :param urlPath:
+        :param gzip: Boolean
+        :return: MicroWebSrvStaticFile | None
+        """
+        with self._staticCacheLock :
+            if not gzip :
+                return self._lookupStaticFile(urlPath, False)
+            misses = self._staticGzipMisses
+            mtime  = misses.get(urlPath)
+            if mtime is None :
+                entry = self._lookupStaticFile(urlPath, True)
+                if entry :
+                    return entry
+            entry = self._lookupStaticFile(urlPath, False)
+            if entry is None :
+                misses.pop(urlPath, None)
+                return None
+            if mtime is not None and mtime != entry.mtime :         # The file changed, a 'file.gz' may have been added
+                gzEntry = self._lookupStaticFile(urlPath, True)
+                if gzEntry :
+                    del misses[urlPath]
+                    return gzEntry
+            misses[urlPath] = entry.mtime
+            return entry
+
+    # ----------------------------------------------------------------------------
+
+    def _lookupStaticFile(self, urlPath, gzip):
+        key   = 'gz:' + urlPath if gzip else urlPath
+        entry = self._staticCache.get(key)
+        if entry :
+            st = MicroWebSrv._fileStat(entry.physPath)
+            if st and st[6] == entry.size and st[8] == entry.mtime and \
+               entry.cacheLevel == self.LetCacheStaticContentLevel :
+                self._staticCacheOrder.remove(key)
+                self._staticCacheOrder.append(key)
+                return entry
+            self._uncacheStaticFile(key)
+        if gzip :
+            physPath, st = self._physPathAndStatFromURLPath(urlPath, '.gz')
+            if not physPath :
+                return None
+            entry = MicroWebSrvStaticFile(physPath, st[6], st[8], self.GetMimeTypeFromFilename(physPath[:-3]), 'gzip')
+            if not entry.contentType :
+                return None
+        else :
+            physPath, st = self._physPathAndStatFromURLPath(urlPath)
+            if not physPath :
+                return None
+            entry = MicroWebSrvStaticFile(physPath, st[6], st[8], self.GetMimeTypeFromFilename(physPath))
+        if entry.contentType :
+            entry.cacheLevel = self.LetCacheStaticContentLevel
+            entry.headers    = self._staticFileHeaders(entry)
+            cost = len(entry.headers)
+            if 0 < entry.size <= self.StaticCacheMaxFileSize and cost + entry.size <= self.StaticCacheMaxBytes :
+                cost += entry.size
+            if cost <= self.StaticCacheMaxBytes :
+                if cost > len(entry.headers) :
+                    with open(physPath, 'rb') as file :
+                        entry.content = file.read()
+                while self._staticCacheBytes + cost > self.StaticCacheMaxBytes :
+                    self._uncacheStaticFile(self._staticCacheOrder[0])
+                entry.cost             = cost
+                self._staticCache[key] = entry
+                self._staticCacheOrder.append(key)
+                self._staticCacheBytes += cost
+        return entry
+
+    # ----------------------------------------------------------------------------
+
+    def _getSendBuffer(self):
+        """
+        Returns the send buffer used to stream files, as a memoryview of SendBufferSize octets. It is allocated once and
+        reused by every response so streaming files does not churn the heap.
+
+        :return: memoryview
+        """
+        buf = self._sendBuf
+        if buf is None or len(buf) != self.SendBufferSize :
+            buf = self._sendBuf = memoryview(bytearray(self.SendBufferSize))
+        return buf
+
+    # ----------------------------------------------------------------------------
+
+    def GetMetrics(self):
+        """
+        Returns the MicroWebSrvMetrics of the server, also served in Prometheus format at MetricsUrl.
+
+        :return: MicroWebSrvMetrics
+        """
+        return self._metrics
+
+    # ----------------------------------------------------------------------------
+
+    def _getKeptHeaderNames(self):
+        """
+        Returns KeepRequestHeaders as a set of lower case bytes names the request parser can match header lines against
+        without decoding them, or 'None' to keep every header. It is rebuilt whenever KeepRequestHeaders changes.
+        """
+        names = self.KeepRequestHeaders
+        if names is None :
+            return None
+        kept = self._keptHeaderNames
+        if kept[0] is not names or kept[1] != len(names) :
+            byteNames = set(name.lower().encode() for name in names)
+            byteNames.add(b'content-type')
+            byteNames.add(b'content-length')
+            kept = self._keptHeaderNames = (names, len(names), byteNames)
+        return kept[2]
+
+    # ----------------------------------------------------------------------------
+
+    def _connectionHeader(self, keepAlive):
+        if not keepAlive :
+            return MicroWebSrv._closeHeader
+        timeout, header = self._keepAliveHeader
+        if timeout != self.KeepAliveTimeoutSec :
+            timeout = self.KeepAliveTimeoutSec
+            header  = ("Connection: keep-alive\r\nKeep-Alive: timeout=%d\r\n" % timeout).encode()
+            self._keepAliveHeader = (timeout, header)
+        return header
+
+    # ----------------------------------------------------------------------------
+
+    def _uncacheStaticFile(self, urlPath):
+        entry = self._staticCache.pop(urlPath)
+        self._staticCacheOrder.remove(urlPath)
+        self._staticCacheBytes -= entry.cost
+
+    # ----------------------------------------------------------------------------
+
+    def _staticFileHeaders(self, entry):
+        headers = "HTTP/1.1 200 OK\r\n"
+        if self.LetCacheStaticContentLevel > 0 :
+            headers += "Last-Modified: %s\r\n" % MicroWebSrv._httpDate(entry.mtime) \
+                     + "ETag: %s\r\n" % entry.etag \
+                     + "Cache-Control: max-age=315360000\r\n"
+        headers += "Content-Type: %s\r\n" % entry.contentType \
+                 + "Content-Length: %d\r\n" % entry.size \
+                 + "Accept-Ranges: bytes\r\n"
+        if entry.encoding :
+            headers += "Content-Encoding: %s\r\n" % entry.encoding
+        if self.GzipStaticContent :
+            headers += "Vary: Accept-Encoding\r\n"
+        return headers.encode() + MicroWebSrv._serverHeader
+
+    # ============================================================================
+    # ===( Class Client  )========================================================
+    # ============================================================================
+
+    class _client :
+        """
+        The main embedded class that handles requests from a client (browser).
+
+        """
+
+        # ------------------------------------------------------------------------
+
+        _sendBuf = None
+
+        def __init__(self, microWebSrv, socket, addr, sendBuf=None):
+            self._microWebSrv   = microWebSrv
+            self._socket        = socket
+            self._addr          = addr
+            self._sendBuf       = sendBuf           # Set by worker threads, which cannot share the server send buffer
+            self._initRequest()
+
+            if hasattr(socket, 'readline'):   # MicroPython
+                self._socketfile = self._socket
+            else:   # CPython
+                self._socketfile = self._socket.makefile('rwb')
+                        
+            self._processRequest()
+
+        # ------------------------------------------------------------------------
+
+        def _initRequest(self):
+            self._keepAlive     = False
+            self._contentRead   = 0
+            self._method        = None
+            self._path          = None
+            self._httpVer       = None
+            self._resPath       = "/"
+            self._queryString   = ""
+            self._queryParams   = None              # Parsed from _queryString on first use
+            self._headers       = { }
+            self._errorCode     = None              # Error response for a request that could not be parsed
+            self._status        = None              # Status code of the response, once one is written
+            self._bytesSent     = 0
+            self._metricsSlot   = MicroWebSrvMetrics.UNMATCHED
+            self._contentType   = None
+            self._contentLength = 0
+
+        # ------------------------------------------------------------------------
+
+        def _processRequest(self):
+            """
+            This private method of embedded class '_client' is responsible for processing HTTP requests from the client.
+
+            :return:
+            """
+            srv   = self._microWebSrv
+            count = 0
+            while True :
+                count += 1
+                start  = ticks_us()
+                try :
+                    response = MicroWebSrv._response(self)          # create a response object template which is empty at this point.
+                    if self._parseFirstLine(response) :
+                        if self._parseHeader(response) :
+                            self._keepAlive = count < self._microWebSrv.KeepAliveMaxRequests and self._wantsKeepAlive()
+                            if self._routeRequest(response) is MicroWebSrv._client._UPGRADED :
+                                return
+                            if self._contentRead < self._contentLength :
+                                self._keepAlive = False             # Unread request content would be parsed as the next request
+                        else :
+                            response.WriteResponseError(self._errorCode or 400)
+                    elif self._errorCode :
+                        response.WriteResponseError(self._errorCode)
+                    if self._socketfile is not self._socket :
+                        self._socketfile.flush()                    # CPython buffers the socket file, the response must go out now
+                except :
+                    self._keepAlive = False
+                    response.WriteResponseInternalServerError()
+                if self._status is not None and srv.CollectMetrics :
+                    srv._metrics.record(self._metricsSlot, self._status, self._bytesSent, ticks_diff(ticks_us(), start))
+                if not self._keepAlive or not self._waitNextRequest() :
+                    break
+                self._initRequest()
+            try :
+                if self._socketfile is not self._socket:
+                    self._socketfile.close()
+                self._socket.close()
+            except :
+                pass
+
+        # ------------------------------------------------------------------------
+
+        def _isNotModified(self, staticFile):
+            """
+            Checks the conditional request headers against the validators of a static file. 'If-None-Match' takes precedence
+            over 'If-Modified-Since', which must carry the exact Last-Modified date we sent.
+
+            :param staticFile: MicroWebSrvStaticFile
+            :return: Boolean
+            """
+            etags = self._headers.get('if-none-match')
+            if etags is not None :
+                return etags.strip() == '*' or staticFile.etag in etags
+            since = self._headers.get('if-modified-since')
+            if since is not None :
+                return since.strip() == MicroWebSrv._httpDate(staticFile.mtime)
+            return False
+
+        # ------------------------------------------------------------------------
+
+        def _getRequestRange(self, size, etag=None, lastModified=None):
+            """
+            Returns the octets of a 'size' octets long content asked for by the 'Range' header of a GET request, as the
+            (first, last) offsets of a single range. Returns 'None' if the whole content must be sent: there is no range,
+            it is not one valid 'bytes' range, or 'If-Range' does not match the given validators. Returns 'False' if the
+            range is beyond the content.
+
+            :param size:
+            :param etag:
+            :param lastModified: HTTP date
+            :return: (int, int) | None | False
+            """
+            rng = self._headers.get('range')
+            if rng is None or self._method != 'GET' :
+                return None
+            rng = rng.strip()
+            if not rng.startswith('bytes=') or ',' in rng :
+                return None                                         # Several ranges, the whole content is simpler and allowed
+            ifRange = self._headers.get('if-range')
+            if ifRange is not None and ifRange.strip() not in (etag, lastModified) :
+                return None
+            bounds = rng[6:].split('-', 1)
+            try :
+                if bounds[0].strip() :
+                    first = int(bounds[0])
+                    last  = int(bounds[1]) if bounds[1].strip() else max(size - 1, first)
+                    if last < first :
+                        return None
+                else :
+                    suffix = int(bounds[1])                         # 'bytes=-500' is the last 500 octets
+                    if suffix <= 0 :
+                        return False
+                    first = max(size - suffix, 0)
+                    last  = size - 1
+            except :
+                return None
+            if first < 0 or first >= size :
+                return False
+            return (first, min(last, size - 1))
+
+        # ------------------------------------------------------------------------
+
+        def _acceptsGzip(self):
+            for coding in self._headers.get('accept-encoding', '').split(',') :
+                coding = coding.split(';')
+                if coding[0].strip().lower() == 'gzip' :
+                    try :
+                        return float(coding[1].split('=')[1]) > 0      # e.g. 'gzip;q=0' refuses gzip
+                    except :
+                        return True
+            return False
+
+        # ------------------------------------------------------------------------
+
+        def _wantsKeepAlive(self):
+            connection = self._headers.get('connection', '').lower()
+            if self._httpVer == 'HTTP/1.1' :
+                return 'close' not in connection
+            return 'keep-alive' in connection
+
+        # ------------------------------------------------------------------------
+
+        def _waitNextRequest(self):
+            """
+            Waits for the next request on a kept alive connection. Returns 'False' if the connection stays idle for
+            KeepAliveTimeoutSec, or if a new connection is waiting to be accepted: the server thread must not sit on an idle
+            connection while other clients queue behind it. With worker threads, the connections waiting in the work queue
+            are checked every 100 ms instead of the listening socket.
+
+            :return: Boolean
+            """
+            srv   = self._microWebSrv
+            queue = srv._workQueue
+            if self._socketfile is not self._socket and self._isRequestBuffered() :
+                return True
+            try :
+                p = select.poll()
+                p.register(self._socket, select.POLLIN)
+                if queue is None :
+                    p.register(srv._server, select.POLLIN)
+                waitMs  = int(srv.KeepAliveTimeoutSec * 1000)
+                sliceMs = waitMs if queue is None else 100
+                while True :
+                    events = p.poll(min(sliceMs, waitMs))
+                    waitMs -= sliceMs
+                    if events or waitMs <= 0 or queue.pending() :
+                        break
+            except :
+                self._socket.settimeout(srv.KeepAliveTimeoutSec)   # No poll support, the next readline times out instead
+                return True
+            for obj, ev in events :
+                if obj is self._socket or obj == MicroWebSrv._fileno(self._socket) :
+                    self._socket.settimeout(srv._clientTimeoutSec)
+                    return True
+            return False
 
-    # ============================================================================
-    # ===( Class Client  )========================================================
-    # ============================================================================
+        # ------------------------------------------------------------------------
 
-    class _client :
-        """
-        The main embedded class that handles requests from a client (browser).
+        def _isRequestBuffered(self):
+            """
+            Tells if a pipelined request is already waiting in the buffered socket file used on CPython. Poll only sees the
+            socket, not what the socket file has read ahead of the previous request. Peeks without blocking.
 
-        """
+            :return: Boolean
+            """
+            try :
+                self._socket.settimeout(0)
+                buffered = self._socketfile.peek(1)
+            except :
+                buffered = None
+            self._socket.settimeout(self._microWebSrv._clientTimeoutSec)
+            return bool(buffered)
 
         # ------------------------------------------------------------------------
 
-        def __init__(self, microWebSrv, socket, addr):
-            self._microWebSrv   = microWebSrv
-            self._socket        = socket
-            self._addr          = addr
-            self._method        = None
-            self._path          = None
-            self._httpVer       = None
-            self._resPath       = "/"
-            self._queryString   = ""
-            self._queryParams   = { }
-            self._headers       = { }
-            self._contentType   = None
-            self._contentLength = 0
-            
-            if hasattr(socket, 'readline'):   # MicroPython
-                self._socketfile = self._socket
-            else:   # CPython
-                self._socketfile = self._socket.makefile('rwb')
-                        
-            self._processRequest()
+        def _getSendBuffer(self):
+            if self._sendBuf is not None :
+                return self._sendBuf
+            return self._microWebSrv._getSendBuffer()
 
         # ------------------------------------------------------------------------
 
-        def _processRequest(self):
+        _UPGRADED = object()
+
+        def _routeRequest(self, response):
             """
-            This private method of embedded class '_client' is responsible for processing HTTP requests from the client.
+            Dispatches a parsed request to its route handler, to a static file or to an error response. Returns whatever the
+            route handler returned (a coroutine for 'async def' handlers) or _UPGRADED if the socket was handed over to a
+            web socket.
 
-            :return:
+            :param response:
+            :return: handler result | _UPGRADED | None
             """
-            try :
-                response = MicroWebSrv._response(self)              # create a response object template which is empty at this point.
-                if self._parseFirstLine(response) :
-                    if self._parseHeader(response) :
-                        upg = self._getConnUpgrade()                # check to see if we can upgrade to web sockets.
-                        if not upg :
-                            routeHandler, routeArgs = self._microWebSrv.GetRouteHandler(self._resPath, self._method)
-                            if routeHandler :                       # If we have a route handler function for this URL patth then use it to handle the response.
-                                if routeArgs is not None:
-                                    routeHandler(self, response, routeArgs)
-                                else:
-                                    routeHandler(self, response)
-                            elif self._method.upper() == "GET" :    # We only allow default GET requests to the server if not handled explicitly
-                                filepath = self._microWebSrv._physPathFromURLPath(self._resPath)        # Get a file path if it is valid and exists
-                                if filepath :
-                                    if MicroWebSrv._isPyHTMLFile(filepath) :
-                                        response.WriteResponsePyHTMLFile(filepath)
-                                    else :
-                                        contentType = self._microWebSrv.GetMimeTypeFromFilename(filepath)
-                                        if contentType :
-                                            if self._microWebSrv.LetCacheStaticContentLevel > 0 :
-                                                if self._microWebSrv.LetCacheStaticContentLevel > 1 and \
-                                                   'if-modified-since' in self._headers :
-                                                    response.WriteResponseNotModified()
-                                                else:
-                                                    headers = { 'Last-Modified' : 'Fri, 1 Jan 2018 23:42:00 GMT', \
-                                                                'Cache-Control' : 'max-age=315360000' }
-                                                    response.WriteResponseFile(filepath, contentType, headers)
-                                            else :
-                                                response.WriteResponseFile(filepath, contentType)
-                                        else :
-                                            response.WriteResponseForbidden()
-                                else :
-                                    response.WriteResponseNotFound()
+            upg = self._getConnUpgrade()                            # check to see if we can upgrade to web sockets.
+            if not upg :
+                rh, routeArgs = self._microWebSrv._getRoute(self._resPath, self._method)
+                if rh :                                             # If we have a route handler function for this URL patth then use it to handle the response.
+                    self._metricsSlot = rh.metricsSlot
+                    if routeArgs is not None:
+                        return rh.func(self, response, routeArgs)
+                    else:
+                        return rh.func(self, response)
+                elif self._method == "GET" and self._resPath == self._microWebSrv.MetricsUrl :
+                    self._metricsSlot = MicroWebSrvMetrics.METRICS
+                    response.WriteResponseStream( self._microWebSrv._metrics.prometheusLines(self._microWebSrv.GetWorkerStats()),
+                                                  contentType = "text/plain; version=0.0.4" )
+                elif self._method.upper() == "GET" :                # We only allow default GET requests to the server if not handled explicitly
+                    self._metricsSlot = MicroWebSrvMetrics.STATIC
+                    gzip = self._microWebSrv.GzipStaticContent and self._acceptsGzip() and 'range' not in self._headers
+                    staticFile = self._microWebSrv._getStaticFile(self._resPath, gzip)     # Get the (cached) file, or its pre-compressed 'file.gz'
+                    if staticFile :
+                        if MicroWebSrv._isPyHTMLFile(staticFile.physPath) :
+                            response.WriteResponsePyHTMLFile(staticFile.physPath)
+                        elif staticFile.contentType :
+                            if self._microWebSrv.LetCacheStaticContentLevel > 1 and self._isNotModified(staticFile) :
+                                response.WriteResponseNotModified({ 'ETag' : staticFile.etag })
                             else :
-                                response.WriteResponseMethodNotAllowed()
-                        elif upg == 'websocket' and 'MicroWebSocket' in globals() \
-                             and self._microWebSrv.AcceptWebSocketCallback :
-                                MicroWebSocket( socket         = self._socket,
-                                                httpClient     = self,
-                                                httpResponse   = response,
-                                                maxRecvLen     = self._microWebSrv.MaxWebSocketRecvLen,
-                                                threaded       = self._microWebSrv.WebSocketThreaded,
-                                                acceptCallback = self._microWebSrv.AcceptWebSocketCallback )
-                                return
+                                response.WriteResponseStaticFile(staticFile)
                         else :
-                            response.WriteResponseNotImplemented()
+                            response.WriteResponseForbidden()
                     else :
-                        response.WriteResponseBadRequest()
-            except :
-                response.WriteResponseInternalServerError()
+                        response.WriteResponseNotFound()
+                else :
+                    response.WriteResponseMethodNotAllowed()
+            elif upg == 'websocket' and 'MicroWebSocket' in globals() \
+                 and self._microWebSrv.AcceptWebSocketCallback and not self._isAsync :
+                    MicroWebSocket( socket         = self._socket,
+                                    httpClient     = self,
+                                    httpResponse   = response,
+                                    maxRecvLen     = self._microWebSrv.MaxWebSocketRecvLen,
+                                    threaded       = self._microWebSrv.WebSocketThreaded,
+                                    acceptCallback = self._microWebSrv.AcceptWebSocketCallback )
+                    return MicroWebSrv._client._UPGRADED
+            else :
+                response.WriteResponseNotImplemented()
+            return None
+
+        # ------------------------------------------------------------------------
+
+        _isAsync = False
+
+        def _sendFile(self, file, size):
+            """
+            Copies 'size' octets of an already opened file to the client socket, in chunks read straight into the server
+            send buffer. The file is owned by this method and is always closed when it returns.
+
+            :param file: file object opened in binary mode
+            :param size: number of octets to send
+            :return:
+            """
             try :
-                if self._socketfile is not self._socket:
-                    self._socketfile.close()
-                self._socket.close()
-            except :
-                pass
+                buf = self._getSendBuffer()
+                n   = len(buf)
+                while size > 0 :
+                    x = file.readinto(buf if size >= n else buf[:size])
+                    if not x :
+                        break
+                    if x < n :
+                        self._socketfile.write(buf[:x])             # call up low level socket write function
+                        if __debug__ and log.isEnabledFor(DEBUG) :
+                            log.debug("Last: %d octets being sent", x)
+                    else :
+                        self._socketfile.write(buf)
+                    self._bytesSent += x
+                    size -= x
+            finally :
+                file.close()
+
+        # ------------------------------------------------------------------------
+
+        def _sendStream(self, response, parts):
+            """
+            Writes the parts of a streamed response, see _response.WriteResponseStream. They are coalesced in the send
+            buffer like any other response.
+            """
+            response._writeParts(parts)
 
         # ------------------------------------------------------------------------
 
         def _parseFirstLine(self, response):
             """
             The simple helper method parses the first line received from the client e.g. "Get /mypath/myfolder/file?parm=2 HTTP/1.1"
-            It then extracts the HTTP method (GET,PUT,POST,DELETE) the path requested /mypath/myfolder/file and querry
-            parameters parm =2.
+            It then extracts the HTTP method (GET,PUT,POST,DELETE), the path requested /mypath/myfolder/file and the query
+            string parm=2. The query parameters are only parsed when GetRequestQueryParams() is called.
             Values are stored in object variables:
                 _method
                 _path
                 _httpVer
-                _queryParams
+                _resPath
+                _queryString
 
-             Returns 'True' if successful.
+            At most MaxRequestLineLength octets are read, a longer line sets _errorCode to 414.
+            Returns 'True' if successful.
 
             :param response:
             :return: Boolean
             """
+            limit = self._microWebSrv.MaxRequestLineLength
             try :
-                elements = self._socketfile.readline().decode().strip().split()     # Parsing HTTP line e.g. ['GET', '/', 'HTTP/1.1']
+                line = self._socketfile.readline(limit)
+                if len(line) > limit or len(line) == limit and not line.endswith(b'\n') :
+                    self._errorCode = 414
+                    return False
+                elements = line.split()                                             # Parsing HTTP line e.g. [b'GET', b'/', b'HTTP/1.1']
                 if len(elements) == 3 :
-                    self._method  = elements[0].upper()
-                    self._path    = elements[1]
-                    self._httpVer = elements[2].upper()
-                    elements      = self._path.split('?', 1)                        # Split querry parms e.g. /mypath/path/end?for=2
-                    log.info("Processing request HTTP Method: %s Path: %s Version: %s", self._method, self._path, self._httpVer)
-                    if len(elements) > 0 :
-                        self._resPath = MicroWebSrv._unquote_plus(elements[0])
-                        if len(elements) > 1 :
-                            self._queryString = elements[1]
-                            elements = self._queryString.split('&')
-                            for s in elements :
-                                param = s.split('=', 1)
-                                if len(param) > 0 :
-                                    value = MicroWebSrv._unquote(param[1]) if len(param) > 1 else ''
-                                    self._queryParams[MicroWebSrv._unquote(param[0])] = value
+                    self._method  = elements[0].decode().upper()
+                    self._path    = elements[1].decode()
+                    self._httpVer = elements[2].decode().upper()
+                    if log.isEnabledFor(INFO) :
+                        log.info("Processing request HTTP Method: %s Path: %s Version: %s", self._method, self._path, self._httpVer)
+                    i = self._path.find('?')                                        # Split querry parms e.g. /mypath/path/end?for=2
+                    if i >= 0 :
+                        self._resPath     = self._path[:i]
+                        self._queryString = self._path[i+1:]
+                    else :
+                        self._resPath     = self._path
+                    if '%' in self._resPath or '+' in self._resPath :
+                        self._resPath = MicroWebSrv._unquote_plus(self._resPath)
                     return True
+                if elements :
+                    self._errorCode = 400
             except :
                 pass
             return False
@@ -519,38 +1830,56 @@ class MicroWebSrv :
 
         def _parseHeader(self, response):
             """
-            Takes a HTTP header and populates the dictionary item self._headers from the incoming request. It does this by
-            doing a socket.readline(). The HTTP header is put in the dictionary e.g.
-
-            {'user-agent': 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/76.0.3809.100 Mobile Safari/537.36',
-            'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3',
-            'upgrade-insecure-requests': '1',
-            'cookie': 'cookielaw_accepted=1',
-            'cache-control': 'no-cache',
+            Reads the HTTP header lines of the incoming request and keeps the ones named in the server KeepRequestHeaders in
+            the dictionary self._headers, with lower case names, e.g.
+
+            {'host': 'localhost:8001',
             'connection': 'keep-alive',
-            'pragma': 'no-cache',
-            'accept-encoding': 'gzip, deflate, br',
-            'sec-fetch-mode': 'navigate',
-            'sec-fetch-site': 'none',
-            'accept-language': 'en-GB,en-US;q=0.9,en;q=0.8',
-            'sec-fetch-user': '?1',
-            'host': 'localhost:8001'}
+            'accept-encoding': 'gzip, deflate, br'}
+
+            Other headers, such as long user-agent or cookie lines, are read in MaxRequestLineLength chunks and dropped
+            without being decoded. A kept header longer than MaxRequestLineLength, or more than MaxRequestHeaders header
+            lines, set _errorCode to 431.
 
             :param response:
             :return: Boolean
 
             """
+            srv   = self._microWebSrv
+            limit = srv.MaxRequestLineLength
+            kept  = srv._getKeptHeaderNames()
+            count = 0
             while True :
-                elements = self._socketfile.readline().decode().strip().split(':', 1)
-                if len(elements) == 2 :
-                    self._headers[elements[0].strip().lower()] = elements[1].strip()
-                elif len(elements) == 1 and len(elements[0]) == 0 :
-                    if self._method == 'POST' or self._method == 'PUT' :
-                        self._contentType   = self._headers.get("content-type", None)
-                        self._contentLength = int(self._headers.get("content-length", 0))
-                    return True
-                else :
+                line = self._socketfile.readline(limit)
+                if line == b'\r\n' or line == b'\n' :
+                    break
+                count += 1
+                if count > srv.MaxRequestHeaders :
+                    self._errorCode = 431
                     return False
+                tooLong = len(line) > limit or len(line) == limit and not line.endswith(b'\n')
+                i = line.find(b':')
+                if i <= 0 :
+                    if tooLong :
+                        self._errorCode = 431
+                    return False
+                name = line[:i].strip().lower()
+                if kept is None or name in kept :
+                    if tooLong :
+                        self._errorCode = 431
+                        return False
+                    self._headers[name.decode()] = line[i+1:].strip().decode()
+                else :
+                    while line and not line.endswith(b'\n') :              # Skip the rest of a long dropped header
+                        line = self._socketfile.readline(limit)
+                    if not line :
+                        return False
+            self._contentType = self._headers.get("content-type", None)
+            try :
+                self._contentLength = int(self._headers.get("content-length", 0))
+            except :
+                return False
+            return self._contentLength >= 0
 
         # ------------------------------------------------------------------------
 
@@ -602,11 +1931,17 @@ class MicroWebSrv :
         # ------------------------------------------------------------------------
 
         def GetRequestQueryParams(self):
+            if self._queryParams is None :
+                self._queryParams = MicroWebSrv._parseURLEncoded(self._queryString)
             return self._queryParams
 
         # ------------------------------------------------------------------------
 
         def GetRequestHeaders(self):
+            """
+            Returns the request headers named in the server KeepRequestHeaders, by lower case name. Add a name to
+            KeepRequestHeaders before starting the server to have a handler receive that header.
+            """
             return self._headers
 
         # ------------------------------------------------------------------------
@@ -622,31 +1957,33 @@ class MicroWebSrv :
         # ------------------------------------------------------------------------
 
         def ReadRequestContent(self, size=None):
-            self._socket.setblocking(False)
+            """
+            Reads up to 'size' octets of the request content, or all of the content not read yet. Never reads past the
+            request Content-Length, and waits at most the client timeout for the octets to arrive.
+
+            :param size:
+            :return: bytes
+            """
+            remaining = self._contentLength - self._contentRead
+            if not size or size > remaining :
+                size = remaining
             b = None
-            try :
-                if not size :
-                    b = self._socketfile.read(self._contentLength)
-                elif size > 0 :
+            if size > 0 :
+                try :
                     b = self._socketfile.read(size)
-            except :
-                pass
-            self._socket.setblocking(True)
+                except :
+                    pass
+            if b :
+                self._contentRead += len(b)
             return b if b else b''
 
         # ------------------------------------------------------------------------
 
         def ReadRequestPostedFormData(self):
-            res  = { }
             data = self.ReadRequestContent()
             if len(data) > 0 :
-                elements = data.decode().split('&')
-                for s in elements :
-                    param = s.split('=', 1)
-                    if len(param) > 0 :
-                        value = MicroWebSrv._unquote(param[1]) if len(param) > 1 else ''
-                        res[MicroWebSrv._unquote(param[0])] = value
-            return res
+                return MicroWebSrv._parseURLEncoded(data.decode())
+            return { }
 
         # ------------------------------------------------------------------------
 
@@ -656,6 +1993,286 @@ class MicroWebSrv :
             except :
                 return None
         
+    # ============================================================================
+    # ===( Class Async Client  )==================================================
+    # ============================================================================
+
+    class _asyncClient(_client) :
+        """
+        The client used by Start(mode='async'). The request head and body are read from the stream without blocking the
+        event loop, then parsed and dispatched by the same code as the threaded '_client' through an in-memory socket file.
+        Everything the handler writes is queued and sent back with non-blocking writes once the handler has returned.
+
+        """
+
+        _isAsync = True
+
+        # CPython stream transports may keep a reference to written data instead of copying it, so the reused send buffer
+        # must be copied there. uasyncio copies whatever it cannot write at once.
+        _copyWrites = sys.implementation.name != 'micropython'
+
+        # ------------------------------------------------------------------------
+
+        def __init__(self, microWebSrv, reader, writer, addr):
+            self._microWebSrv   = microWebSrv
+            self._reader        = reader
+            self._writer        = writer
+            self._addr          = addr
+            self._socketfile    = MicroWebSrv._asyncSocketFile()
+            self._socket        = self._socketfile
+            self._pending       = b''               # Octets received past the current request head or content
+            self._initRequest()
+
+        # ------------------------------------------------------------------------
+
+        async def _readRequestHead(self):
+            """
+            Reads the stream in chunks until the empty line ending the request head, and feeds the head to the socket file
+            line by line. Header lines that are not kept, such as long user-agent or cookie lines, are fed as their name only
+            and dropped as they arrive, so at most one MaxRequestLineLength line is buffered. Reading stops at a line or a
+            header count the parser rejects. Octets after the head are kept for the content or the next request.
+            """
+            srv   = self._microWebSrv
+            limit = srv.MaxRequestLineLength
+            kept  = srv._getKeptHeaderNames()
+            feed  = self._socketfile.feed
+            data  = self._pending
+            lines = 0
+            skip  = False                                           # Dropping the rest of a long header line
+            while True :
+                i = data.find(b'\n')
+                if skip :
+                    if i < 0 :
+                        data = b''
+                    else :
+                        data = data[i+1:]
+                        skip = False
+                        continue
+                elif i >= 0 or len(data) >= limit :
+                    line = data[:i+1] if i >= 0 else data[:limit]
+                    data = data[i+1:] if i >= 0 else b''
+                    if lines and line != b'\r\n' and line != b'\n' :
+                        j = line.find(b':')
+                        if j > 0 and kept is not None and line[:j].strip().lower() not in kept :
+                            feed(line[:j+1] + b'\r\n')
+                            skip  = i < 0
+                            line  = None
+                    if line is not None :
+                        feed(line)
+                        if i < 0 or line == b'\r\n' or line == b'\n' :
+                            break                                   # End of the head, or a line too long for the parser
+                    lines += 1
+                    if lines > srv.MaxRequestHeaders + 1 :
+                        break
+                    continue
+                chunk = await self._reader.read(512)
+                if not chunk :
+                    feed(data)
+                    data = b''
+                    break
+                data += chunk
+            self._pending = data
+
+        # ------------------------------------------------------------------------
+
+        async def _readRequestContent(self, size):
+            data = self._pending[:size]
+            self._pending = self._pending[size:]
+            if len(data) < size :
+                data += await self._reader.readexactly(size - len(data))
+            self._socketfile.feed(data)
+
+        # ------------------------------------------------------------------------
+
+        async def _receiveRequestContent(self, response):
+            """
+            Receives the request content before the route handler runs, as the handler reads it from the socket file without
+            awaiting. Content is only received for a route handler and up to MaxRequestContentLength octets, more gets a 413.
+            Content that is not received closes the connection after the response, as it would be parsed as the next request.
+
+            :param response:
+            :return: Boolean, False if the response was already written
+            """
+            srv  = self._microWebSrv
+            size = self._contentLength
+            if size <= 0 :
+                return True
+            if self._getConnUpgrade() or not srv._getRoute(self._resPath, self._method)[0] :
+                self._keepAlive = False
+                return True
+            if size > srv.MaxRequestContentLength :
+                self._keepAlive = False
+                response.WriteResponseError(413)
+                return False
+            await asyncio.wait_for(self._readRequestContent(size), srv._clientTimeoutSec)
+            return True
+
+        # ------------------------------------------------------------------------
+
+        async def _processRequestAsync(self):
+            """
+            The event loop counterpart of '_client._processRequest'. Awaits the result of 'async def' route handlers.
+
+            :return:
+            """
+            srv     = self._microWebSrv
+            timeout = srv._clientTimeoutSec
+            count   = 0
+            while True :
+                count   += 1
+                response = MicroWebSrv._response(self)
+                try :
+                    await asyncio.wait_for(self._readRequestHead(), timeout)
+                except Exception as e :
+                    log.debug("No request received from %s: %s", self._addr, e)
+                    self._socketfile.reset()
+                start = ticks_us()
+                try :
+                    if self._parseFirstLine(response) :
+                        if self._parseHeader(response) :
+                            self._keepAlive = count < srv.KeepAliveMaxRequests and self._wantsKeepAlive()
+                            if await self._receiveRequestContent(response) :
+                                res = self._routeRequest(response)
+                                if hasattr(res, 'send') :           # 'async def' route handler
+                                    await res
+                        else :
+                            response.WriteResponseError(self._errorCode or 400)
+                    elif self._errorCode :
+                        response.WriteResponseError(self._errorCode)
+                except Exception as e :
+                    log.debug("Problem processing async request from %s: %s", self._addr, e)
+                    self._keepAlive = False
+                    self._socketfile._out.clear()                   # Drop any partial response and send a clean error
+                    self._bytesSent = 0
+                    response.WriteResponseInternalServerError()
+                try :
+                    await self._drain()
+                except Exception as e :
+                    log.debug("Problem sending async response to %s: %s", self._addr, e)
+                    self._keepAlive = False
+                if self._status is not None and srv.CollectMetrics :
+                    srv._metrics.record(self._metricsSlot, self._status, self._bytesSent, ticks_diff(ticks_us(), start))
+                if not self._keepAlive :
+                    break
+                self._initRequest()
+                self._socketfile.reset()
+                timeout = srv.KeepAliveTimeoutSec
+            try :
+                self._writer.close()
+                await self._writer.wait_closed()
+            except :
+                pass
+
+        # ------------------------------------------------------------------------
+
+        def _sendFile(self, file, size):
+            self._socketfile._out.append((file, size))             # Sent from _drain once the handler has returned
+
+        # ------------------------------------------------------------------------
+
+        def _sendStream(self, response, parts):
+            self._socketfile._out.append(parts)                     # Iterated from _drain, so the content is never held in RAM
+
+        # ------------------------------------------------------------------------
+
+        async def _drain(self):
+            out = self._socketfile._out
+            while out :
+                item = out.pop(0)
+                if isinstance(item, tuple) :
+                    file, size = item
+                    try :
+                        buf = self._getSendBuffer()
+                        n   = len(buf)
+                        while size > 0 :
+                            x = file.readinto(buf if size >= n else buf[:size])
+                            if not x :
+                                break
+                            data = buf if x == n else buf[:x]
+                            self._writer.write(bytes(data) if self._copyWrites else data)
+                            await self._writer.drain()
+                            self._bytesSent += x
+                            size -= x
+                    finally :
+                        file.close()
+                elif isinstance(item, bytes) :
+                    self._writer.write(item)
+                else :
+                    await self._drainStream(item)
+            await self._writer.drain()
+
+        # ------------------------------------------------------------------------
+
+        async def _drainStream(self, parts):
+            buf  = self._getSendBuffer()
+            size = len(buf)
+            n    = 0
+            for part in parts :
+                l = len(part)
+                self._bytesSent += l
+                if n + l > size :
+                    if n :
+                        self._writer.write(bytes(buf[:n]) if self._copyWrites else buf[:n])
+                        await self._writer.drain()
+                        n = 0
+                    if l > size :
+                        self._writer.write(part)
+                        await self._writer.drain()
+                        continue
+                buf[n:n+l] = part
+                n += l
+            if n :
+                self._writer.write(bytes(buf[:n]) if self._copyWrites else buf[:n])
+                await self._writer.drain()
+
+    # ============================================================================
+    # ===( Class Async Socket File  )=============================================
+    # ============================================================================
+
+    class _asyncSocketFile :
+        """
+        A minimal socket file used by '_asyncClient'. Reads are served from the request bytes already received and writes
+        are queued in '_out' until the client drains them to the stream.
+
+        """
+
+        def __init__(self) :
+            self._out = [ ]
+            self.reset()
+
+        def reset(self) :
+            self._in  = b''
+            self._pos = 0
+
+        def feed(self, data) :
+            self._in += data
+
+        def readline(self, limit=-1) :
+            i   = self._in.find(b'\n', self._pos)
+            end = len(self._in) if i < 0 else i + 1
+            if limit >= 0 and end - self._pos > limit :
+                end = self._pos + limit
+            line, self._pos = self._in[self._pos:end], end
+            return line
+
+        def read(self, size=-1) :
+            end = len(self._in) if size is None or size < 0 else self._pos + size
+            data, self._pos = self._in[self._pos:end], min(end, len(self._in))
+            return data
+
+        def write(self, data) :
+            self._out.append(bytes(data))
+            return len(data)
+
+        def setblocking(self, flag) :
+            pass
+
+        def flush(self) :
+            pass
+
+        def close(self) :
+            pass
+
     # ============================================================================
     # ===( Class Response  )======================================================
     # ============================================================================
@@ -665,7 +2282,8 @@ class MicroWebSrv :
         # ------------------------------------------------------------------------
 
         def __init__(self, client) :
-            self._client = client
+            self._client  = client
+            self._chunked = False
 
         # ------------------------------------------------------------------------
 
@@ -673,65 +2291,176 @@ class MicroWebSrv :
             if data :
                 if type(data) == str :
                     data = data.encode()
+                self._client._bytesSent += len(data)
                 return self._client._socketfile.write(data)
             return 0
 
         # ------------------------------------------------------------------------
 
-        def _writeFirstLine(self, code):
-            reason = self._responseCodes.get(code, ('Unknown reason', ))[0]
-            self._write("HTTP/1.1 %s %s\r\n" % (code, reason))
-
-        # ------------------------------------------------------------------------
+        def _writeParts(self, parts):
+            """
+            Writes a sequence of bytes objects to the client. Consecutive parts are copied into the server send buffer and
+            sent with as few socket writes as possible, so a whole response head, and a short content with it, goes out in
+            a single write and usually a single TCP segment. 'None' parts are skipped.
 
-        def _writeHeader(self, name, value):
-            self._write("%s: %s\r\n" % (name, value))
+            :param parts: sequence of bytes | None
+            :return:
+            """
+            sock = self._client._socketfile
+            buf  = self._client._getSendBuffer()
+            size = len(buf)
+            n    = 0
+            for part in parts :
+                if part :
+                    l = len(part)
+                    self._client._bytesSent += l
+                    if n + l > size :
+                        if n :
+                            sock.write(buf[:n])
+                            n = 0
+                        if l > size :
+                            sock.write(part)
+                            continue
+                    buf[n:n+l] = part
+                    n += l
+            if n :
+                sock.write(buf[:n])
 
         # ------------------------------------------------------------------------
 
-        def _writeContentTypeHeader(self, contentType, charset=None):
-            if contentType :
-                ct = contentType \
-                   + (("; charset=%s" % charset) if charset else "")
-            else :
-                ct = "application/octet-stream"
-            self._writeHeader("Content-Type", ct)
+        def _statusLine(self, code):
+            line = self._statusLines.get(code)
+            if line is None :
+                reason = self._responseCodes.get(code, ('Unknown reason', ))[0]
+                line   = self._statusLines[code] = ("HTTP/1.1 %s %s\r\n" % (code, reason)).encode()
+            return line
 
         # ------------------------------------------------------------------------
 
-        def _writeServerHeader(self):
-            self._writeHeader("Server", "MicroWebSrv by JC`zic")
+        def _writeBeforeContent(self, code, headers, contentType, contentCharset, contentLength, content=None):
+            """
+            Builds the status line and all headers and writes them, followed by 'content' if given, in one go.
+            """
+            self._writeParts(self._headParts(code, headers, contentType, contentCharset, contentLength) + (content,))
 
         # ------------------------------------------------------------------------
 
-        def _writeEndHeader(self):
-            self._write("\r\n")
+        def _connectionHeader(self):
+            """
+            Returns the Connection header of the response. Request content the handler left unread would be parsed as the
+            next request, so the connection is then closed after the response, and the header says so.
+            """
+            client = self._client
+            if client._contentRead < client._contentLength and not client._isAsync :
+                client._keepAlive = False
+            return client._microWebSrv._connectionHeader(client._keepAlive)
 
         # ------------------------------------------------------------------------
 
-        def _writeBeforeContent(self, code, headers, contentType, contentCharset, contentLength):
-            self._writeFirstLine(code)
+        def _headParts(self, code, headers, contentType, contentCharset, contentLength):
+            """
+            Returns the encoded status line and headers of a response as a tuple of bytes, ending with the empty line. A
+            'None' contentLength is for streamed content, sent chunked on a kept alive HTTP/1.1 connection and otherwise
+            until the connection is closed.
+            """
+            self._client._status = code
+            connection = self._connectionHeader()                   # Decides keep-alive before it is used for chunking
+            h = [ ]
             if isinstance(headers, dict) :
                 for header in headers :
-                    self._writeHeader(header, headers[header])
-            if contentLength > 0 :
-                self._writeContentTypeHeader(contentType, contentCharset)
-                self._writeHeader("Content-Length", contentLength)
-            self._writeServerHeader()
-            self._writeHeader("Connection", "close")
-            self._writeEndHeader()
+                    h.append("%s: %s\r\n" % (header, headers[header]))
+            if contentLength is None or contentLength > 0 :
+                if contentType :
+                    if contentCharset :
+                        h.append("Content-Type: %s; charset=%s\r\n" % (contentType, contentCharset))
+                    else :
+                        h.append("Content-Type: %s\r\n" % contentType)
+                else :
+                    h.append("Content-Type: application/octet-stream\r\n")
+                if contentLength is None :
+                    self._chunked = self._client._keepAlive and self._client._httpVer == 'HTTP/1.1'
+                    if self._chunked :
+                        h.append("Transfer-Encoding: chunked\r\n")
+                    else :
+                        self._client._keepAlive = False             # The end of the content is the end of the connection
+                else :
+                    h.append("Content-Length: %d\r\n" % contentLength)
+            elif code >= 200 and code != 204 and code != 304 :
+                h.append("Content-Length: 0\r\n")                  # An empty body must still be delimited on a kept alive connection
+            return ( self._statusLine(code),
+                     ''.join(h).encode(),
+                     MicroWebSrv._serverHeader,
+                     connection,
+                     b"\r\n" )
+
+        # ------------------------------------------------------------------------
+
+        @staticmethod
+        def _streamParts(head, iterable, chunked):
+            """
+            Generates the parts of a streamed response: the head, then every non empty str or bytes item of 'iterable',
+            framed as an HTTP/1.1 chunk if 'chunked' is 'True', then the last chunk.
+            """
+            for part in head :
+                yield part
+            for data in iterable :
+                if data :
+                    if type(data) == str :
+                        data = data.encode()
+                    if chunked :
+                        yield ("%x\r\n" % len(data)).encode()
+                        yield data
+                        yield b"\r\n"
+                    else :
+                        yield data
+            if chunked :
+                yield b"0\r\n\r\n"
+
+        # ------------------------------------------------------------------------
+
+        def WriteResponseStream(self, iterable, contentType=None, headers=None, contentCharset=None, code=200):
+            """
+            Sends a response whose content is produced piece by piece, e.g. by a generator reading sensor history from
+            flash, so the content never has to be held in RAM as a whole. Every str or bytes item of 'iterable' is sent as
+            an HTTP/1.1 chunk; small items are gathered in the send buffer and go out together. HTTP/1.0 clients, and
+            connections that are not kept alive, get the content unframed and the connection is closed after it.
+            If 'iterable' raises, the content is cut short and the connection is closed so the client sees it incomplete.
+
+            Example:
+                def rows() :
+                    yield "time,lux\n"
+                    for t, lux in history :
+                        yield "%d,%.1f\n" % (t, lux)
+                httpResponse.WriteResponseStream(rows(), contentType="text/csv")
+
+            :param iterable: iterable of str | bytes
+            :param contentType: (e.g. text/csv)
+            :param headers:
+            :param contentCharset:
+            :param code:
+            :return: Boolean
+            """
+            try :
+                head = self._headParts(code, headers, contentType, contentCharset, None)
+                self._client._sendStream(self, MicroWebSrv._response._streamParts(head, iterable, self._chunked))
+                return True
+            except Exception as e :
+                self._client._keepAlive = False
+                log.exc(e, "Problem sending streamed response. Response code (%d)", code)
+                return False
 
         # ------------------------------------------------------------------------
 
         def WriteSwitchProto(self, upgrade, headers=None):
-            self._writeFirstLine(101)
-            self._writeHeader("Connection", "Upgrade")
-            self._writeHeader("Upgrade",    upgrade)
+            self._client._status = 101
+            h = [ "Connection: Upgrade\r\nUpgrade: %s\r\n" % upgrade ]
             if isinstance(headers, dict) :
                 for header in headers :
-                    self._writeHeader(header, headers[header])
-            self._writeServerHeader()
-            self._writeEndHeader()
+                    h.append("%s: %s\r\n" % (header, headers[header]))
+            self._writeParts(( self._statusLine(101),
+                               ''.join(h).encode(),
+                               MicroWebSrv._serverHeader,
+                               b"\r\n" ))
             if self._client._socketfile is not self._client._socket :
                 self._client._socketfile.flush()   # CPython needs flush to continue protocol
 
@@ -762,10 +2491,9 @@ class MicroWebSrv :
                     contentLength = len(content)
                 else :
                     contentLength = 0
-                log.debug("Server writing response via route handler. Response code: %d Content Length: %d", code, contentLength)
-                self._writeBeforeContent(code, headers, contentType, contentCharset, contentLength)
-                if content :
-                    self._write(content)
+                if __debug__ and log.isEnabledFor(DEBUG) :
+                    log.debug("Server writing response via route handler. Response code: %d Content Length: %d", code, contentLength)
+                self._writeBeforeContent(code, headers, contentType, contentCharset, contentLength, content)
                 return True
             except Exception as e:
                 log.exc(e, "Problem sending response via route handler. Response code (%d) Content Length: (%d)", code, contentLength)
@@ -794,6 +2522,29 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
+        def WriteResponseTemplate(self, template, values, contentType="text/html", contentCharset="UTF-8", headers=None, code=200):
+            """
+            Sends a page made from a MicroWebSrvTemplate and one value per '%s' slot. The pre-encoded fragments are written
+            as they are, large ones straight from the template without copying.
+
+            :param template: MicroWebSrvTemplate
+            :param values: tuple with one str | bytes | other value, passed through str(), per slot
+            :param contentType:
+            :param contentCharset:
+            :param headers:
+            :param code:
+            :return: Boolean
+            """
+            try :
+                parts, length = template.Parts(values)
+                self._writeParts(self._headParts(code, headers, contentType, contentCharset, length) + parts)
+                return True
+            except Exception as e :
+                log.exc(e, "Problem sending template response. Response code (%d)", code)
+                return False
+
+        # ------------------------------------------------------------------------
+
         def WriteResponseFile(self, filepath, contentType=None, headers=None):
             """
             A method to write a file to the client. It takes the path of the file, calculates it's size and copies the file in chunk
@@ -810,24 +2561,33 @@ class MicroWebSrv :
             """
             try :
                 size = stat(filepath)[6]
-                log.debug("Server writing file: %s of size: %s of type: %s to host: %s", filepath, size, contentType, self._client._addr)
+                if __debug__ and log.isEnabledFor(DEBUG) :
+                    log.debug("Server writing file: %s of size: %s of type: %s to host: %s", filepath, size, contentType, self._client._addr)
                 if size > 0 :
-                    with open(filepath, 'rb') as file :                                 # Open file for reading in binary mode
-                        self._writeBeforeContent(200, headers, contentType, None, size) # Write our HTTP header
-                        try :
-                            buf = bytearray(1024)
-                            while size > 0 :
-                                x = file.readinto(buf)
-                                if x < len(buf) :
-                                    buf = memoryview(buf)[:x]
-                                    log.debug("Last: %d octets being sent", x)
-                                self._write(buf)                                        # call up low level socket write function
-                                size -= x
-                            return True
-                        except Exception as e:
-                            log.exc(e, "Problem sending file: (%s) of size: (%d)", filepath, size)
-                            self.WriteResponseInternalServerError()
-                            return False
+                    headers = dict(headers) if isinstance(headers, dict) else { }
+                    headers['Accept-Ranges'] = 'bytes'
+                    rng = self._client._getRequestRange(size, headers.get('ETag'), headers.get('Last-Modified'))
+                    if rng is False :
+                        return self.WriteResponseRangeNotSatisfiable(size)
+                    file = open(filepath, 'rb')                                         # Open file for reading in binary mode
+                    try :
+                        if rng :
+                            file.seek(rng[0])                                           # Only the requested octets are read from flash
+                            headers['Content-Range'] = 'bytes %d-%d/%d' % (rng[0], rng[1], size)
+                            code, size = 206, rng[1] - rng[0] + 1
+                        else :
+                            code = 200
+                        self._writeBeforeContent(code, headers, contentType, None, size) # Write our HTTP header
+                    except :
+                        file.close()
+                        raise
+                    try :
+                        self._client._sendFile(file, size)                              # The client streams the file content and closes it
+                        return True
+                    except Exception as e:
+                        log.exc(e, "Problem sending file: (%s) of size: (%d)", filepath, size)
+                        self.WriteResponseInternalServerError()
+                        return False
             except :
                 pass
             self.WriteResponseNotFound()
@@ -835,6 +2595,99 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
+        def WriteResponseStaticFile(self, staticFile):
+            """
+            Sends a static file from the server cache. The pre-encoded headers are written as they are and the content comes
+            from RAM if it is cached, otherwise it is streamed from the file. A request for a range of the file gets a
+            '206 Partial Content' response instead, see _writeStaticFileRange.
+
+            :param staticFile: MicroWebSrvStaticFile
+            :return: Boolean
+            """
+            if __debug__ and log.isEnabledFor(DEBUG) :
+                log.debug("Server writing static file: %s of size: %s to host: %s", staticFile.physPath, staticFile.size, self._client._addr)
+            if 'range' in self._client._headers :
+                rng = self._client._getRequestRange( staticFile.size, staticFile.etag,
+                                                     MicroWebSrv._httpDate(staticFile.mtime) )
+                if rng is False :
+                    return self.WriteResponseRangeNotSatisfiable(staticFile.size)
+                if rng :
+                    return self._writeStaticFileRange(staticFile, rng[0], rng[1])
+            if staticFile.content is None and staticFile.size > 0 :
+                try :
+                    file = open(staticFile.physPath, 'rb')
+                except :
+                    return self.WriteResponseNotFound()
+            else :
+                file = None
+            self._client._status = 200
+            self._writeParts(( staticFile.headers,
+                               self._connectionHeader(),
+                               b"\r\n",
+                               staticFile.content ))
+            if file :
+                self._client._sendFile(file, staticFile.size)
+            return True
+
+        # ------------------------------------------------------------------------
+
+        def _writeStaticFileRange(self, staticFile, first, last):
+            """
+            Sends the octets 'first' to 'last' of a static file with a '206 Partial Content' response. They are sliced from
+            the cached content or read from the file after a seek to 'first'.
+            """
+            size = last - first + 1
+            file = None
+            if staticFile.content is None :
+                try :
+                    file = open(staticFile.physPath, 'rb')
+                    file.seek(first)
+                except :
+                    if file :
+                        file.close()
+                    return self.WriteResponseNotFound()
+                content = None
+            else :
+                content = memoryview(staticFile.content)[first:last+1]
+            headers = { 'Content-Range' : 'bytes %d-%d/%d' % (first, last, staticFile.size),
+                        'Accept-Ranges' : 'bytes' }
+            if self._client._microWebSrv.LetCacheStaticContentLevel > 0 :
+                headers['ETag']          = staticFile.etag
+                headers['Last-Modified'] = MicroWebSrv._httpDate(staticFile.mtime)
+            if staticFile.encoding :
+                headers['Content-Encoding'] = staticFile.encoding
+            try :
+                self._writeBeforeContent(206, headers, staticFile.contentType, None, size, content)
+            except :
+                if file :
+                    file.close()
+                raise
+            if file :
+                self._client._sendFile(file, size)
+            return True
+
+        # ------------------------------------------------------------------------
+
+        def WriteResponseRangeNotSatisfiable(self, size):
+            """
+            Sends a '416 Range Not Satisfiable' response for a request whose range starts past the end of a 'size' octets
+            long content.
+            """
+            head, content = self._cannedError(416)
+            self._client._status = 416
+            try :
+                self._writeParts(( head,
+                                   ("Content-Range: bytes */%d\r\n" % size).encode(),
+                                   self._connectionHeader(),
+                                   b"\r\n",
+                                   content ))
+                return True
+            except Exception as e:
+                log.exc(e, "Problem sending error response. Response code (%d)", 416)
+                return False
+
+        # ------------------------------------------------------------------------
+
         def WriteResponseFileAttachment(self, filepath, attachmentName, headers=None):
             if not isinstance(headers, dict) :
                 headers = { }
@@ -860,16 +2713,39 @@ class MicroWebSrv :
         # ------------------------------------------------------------------------
 
         def WriteResponseError(self, code):
-            responseCode = self._responseCodes.get(code, ('Unknown reason', ''))
-            return self.WriteResponse( code,
-                                       None,
-                                       "text/html",
-                                       "UTF-8",
-                                       self._errCtnTmpl % {
-                                            'code'    : code,
-                                            'reason'  : responseCode[0],
-                                            'message' : responseCode[1]
-                                       } )
+            """
+            Sends the error page for an HTTP code. The page and its headers are rendered and encoded only once per code and
+            then reused, see _cannedError.
+            """
+            head, content = self._cannedError(code)
+            self._client._status = code
+            try :
+                self._writeParts(( head,
+                                   self._connectionHeader(),
+                                   b"\r\n",
+                                   content ))
+                return True
+            except Exception as e:
+                log.exc(e, "Problem sending error response. Response code (%d)", code)
+                return False
+
+        # ------------------------------------------------------------------------
+
+        @classmethod
+        def _cannedError(cls, code):
+            canned = cls._cannedErrors.get(code)
+            if canned is None :
+                responseCode = cls._responseCodes.get(code, ('Unknown reason', ''))
+                content = ( cls._errCtnTmpl % {
+                                'code'    : code,
+                                'reason'  : responseCode[0],
+                                'message' : responseCode[1]
+                            } ).encode()
+                head = ( "HTTP/1.1 %s %s\r\n" % (code, responseCode[0])
+                       + "Content-Type: text/html; charset=UTF-8\r\n"
+                       + "Content-Length: %d\r\n" % len(content) ).encode() + MicroWebSrv._serverHeader
+                canned = cls._cannedErrors[code] = (head, content)
+            return canned
 
         # ------------------------------------------------------------------------
 
@@ -882,8 +2758,8 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
-        def WriteResponseNotModified(self):
-            return self.WriteResponseError(304)
+        def WriteResponseNotModified(self, headers=None):
+            return self.WriteResponse(304, headers, None, None, None)  # A 304 never has a body
 
         # ------------------------------------------------------------------------
 
@@ -943,6 +2819,11 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
+        _statusLines  = { }         # HTTP code -> encoded status line
+        _cannedErrors = { }         # HTTP code -> (encoded status line and headers, encoded error page)
+
+        # ------------------------------------------------------------------------
+
         _execErrCtnTmpl = """\
         <html>
             <head>
@@ -1011,6 +2892,8 @@ class MicroWebSrv :
                   'Cannot satisfy request range.'),
             417: ('Expectation Failed',
                   'Expect condition could not be satisfied.'),
+            431: ('Request Header Fields Too Large',
+                  'Request header fields are too large.'),
 
             500: ('Internal Server Error', 'Server got itself in trouble'),
             501: ('Not Implemented',
@@ -0,0 +1,142 @@
+"""
+MIT License
+Copyright (c) 2019 Samsung. n.herriot@samsung.com
+
+Benchmark for streaming files with MicroWebSrv. Full GET requests for a 64KB file are run through the server against an
+in-memory socket, once with the former per-response 1024 octet buffer and then with the reused server send buffer at
+several SendBufferSize values. Reports throughput and the heap allocated per request: on MicroPython this is measured
+with gc.mem_alloc() while the GC is disabled, on CPython with the tracemalloc peak of one request.
+
+Usage:
+    python3 tools/bench_file_send.py          (or: micropython tools/bench_file_send.py)
+"""
+
+import sys, os, gc, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'microserver'))
+
+from web.microWebSrv import MicroWebSrv
+from libraries.logging import logging
+
+try:
+    _ticks_ms, _ticks_diff = time.ticks_ms, time.ticks_diff
+except AttributeError:
+    _ticks_ms = lambda: int(time.time() * 1000)
+    _ticks_diff = lambda a, b: a - b
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+FILE_SIZE = 64 * 1024
+REQUESTS = 200
+WEB_PATH = '/tmp/mws_bench_www'
+REQUEST = b"GET /data.txt HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n"
+
+
+class _MemorySocket:
+    """Just enough of a MicroPython socket for MicroWebSrv._client: reads one request and counts what is written."""
+
+    def __init__(self):
+        self._lines = [line + b'\n' for line in REQUEST.split(b'\n')[:-1]]
+        self.sent = 0
+
+    def readline(self, limit=-1):
+        if not self._lines:
+            return b''
+        line = self._lines.pop(0)
+        if 0 <= limit < len(line):
+            self._lines.insert(0, line[limit:])
+            line = line[:limit]
+        return line
+
+    def write(self, data):
+        self.sent += len(data)
+        return len(data)
+
+    def read(self, size=-1):
+        return b''
+
+    def setblocking(self, flag):
+        pass
+
+    def settimeout(self, value):
+        pass
+
+    def close(self):
+        pass
+
+
+def _legacy_send_file(self, file, size):
+    try:
+        buf = bytearray(1024)
+        while size > 0:
+            x = file.readinto(buf)
+            if not x:
+                break
+            if x < len(buf):
+                buf = memoryview(buf)[:x]
+            self._socketfile.write(buf)
+            size -= x
+    finally:
+        file.close()
+
+
+def _request(server):
+    sock = _MemorySocket()
+    MicroWebSrv._client(server, sock, ('127.0.0.1', 0))
+    assert sock.sent > FILE_SIZE
+
+
+def _heap_per_request(server):
+    if hasattr(gc, 'mem_alloc'):
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        for _ in range(10):
+            _request(server)
+        used = (gc.mem_alloc() - before) // 10
+        gc.enable()
+        return used
+    if tracemalloc:
+        tracemalloc.start()
+        _request(server)
+        used = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return used
+    return -1
+
+
+def _run(label, server):
+    _request(server)                    # warm up the send buffer and the static file cache
+    start = _ticks_ms()
+    for _ in range(REQUESTS):
+        _request(server)
+    elapsed = _ticks_diff(_ticks_ms(), start) or 1
+    heap = _heap_per_request(server)
+    print("%-28s %10.1f MB/s %10d" % (label, REQUESTS * FILE_SIZE / 1024.0 / 1024.0 / (elapsed / 1000.0), heap))
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        os.mkdir(WEB_PATH)
+    except OSError:
+        pass
+    with open(WEB_PATH + '/data.txt', 'wb') as f:
+        f.write(b'x' * FILE_SIZE)
+    server = MicroWebSrv(webPath=WEB_PATH)
+    print("%-28s %13s %10s" % ("send path", "throughput", "heap/req"))
+    original = MicroWebSrv._client._sendFile
+    MicroWebSrv._client._sendFile = _legacy_send_file
+    _run("per-request bytearray(1024)", server)
+    MicroWebSrv._client._sendFile = original
+    for size in (512, 1024, 4096):
+        server.SendBufferSize = size
+        _run("reused buffer (%d)" % size, server)
+    os.remove(WEB_PATH + '/data.txt')
+
+
+if __name__ == '__main__':
+    main()
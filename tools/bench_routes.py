@@ -0,0 +1,87 @@
+"""
+MIT License
+Copyright (c) 2019 Samsung. n.herriot@samsung.com
+
+Micro-benchmark for MicroWebSrv.GetRouteHandler. Registers an increasing number of routes, half of them static and half
+with '<arg>' parts, and times the lookup of the last registered route of each kind. The former linear regex scan is
+reproduced here as a baseline. Runs on CPython and on the unix port of MicroPython.
+
+Usage:
+    python3 tools/bench_routes.py
+"""
+
+import sys, os, re, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'microserver'))
+
+from web.microWebSrv import MicroWebSrv
+
+try:
+    _ticks_us, _ticks_diff = time.ticks_us, time.ticks_diff
+except AttributeError:
+    _ticks_us = lambda: int(time.perf_counter() * 1000000)
+    _ticks_diff = lambda a, b: a - b
+
+LOOKUPS = 2000
+
+
+def _linear_build(routeHandlers):
+    routes = []
+    for route, method, func in routeHandlers:
+        argNames = []
+        regex = ''
+        for s in route.split('/'):
+            if s.startswith('<') and s.endswith('>'):
+                argNames.append(s[1:-1])
+                regex += '/(\\w*)'
+            elif s:
+                regex += '/' + s
+        routes.append((method, func, argNames, re.compile(regex + '$')))
+    return routes
+
+
+def _linear_lookup(routes, resUrl, method):
+    if resUrl.endswith('/'):
+        resUrl = resUrl[:-1]
+    for m, func, argNames, regex in routes:
+        if m == method:
+            match = regex.match(resUrl)
+            if match:
+                args = {}
+                for i, name in enumerate(argNames):
+                    value = match.group(i + 1)
+                    try:
+                        value = int(value)
+                    except:
+                        pass
+                    args[name] = value
+                return func, args
+    return None, None
+
+
+def _time(lookup, url):
+    start = _ticks_us()
+    for _ in range(LOOKUPS):
+        lookup(url, 'GET')
+    return _ticks_diff(_ticks_us(), start) / LOOKUPS
+
+
+def main():
+    handler = lambda httpClient, httpResponse, args=None: None
+    print("%6s  %-22s %12s %12s" % ("routes", "path", "linear (us)", "indexed (us)"))
+    for count in (10, 50, 100, 500):
+        routeHandlers = []
+        for i in range(count // 2):
+            routeHandlers.append(('/static%d/page' % i, 'GET', handler))
+            routeHandlers.append(('/items%d/<index>/abc/<foo>' % i, 'GET', handler))
+        server = MicroWebSrv(routeHandlers=routeHandlers)
+        linear = _linear_build(routeHandlers)
+        last = count // 2 - 1
+        for url in ('/static%d/page' % last, '/items%d/123/abc/bar' % last):
+            t_linear = _time(lambda u, m: _linear_lookup(linear, u, m), url)
+            t_indexed = _time(server.GetRouteHandler, url)
+            print("%6d  %-22s %12.2f %12.2f" % (count, url, t_linear, t_indexed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+MIT License
+Copyright (c) 2019 Samsung. n.herriot@samsung.com
+
+Benchmark for HTTPS handshakes with MicroWebSrv. Opens one connection per request and reports the time from connect()
+to the end of the TLS handshake, for new clients and for returning clients that resume their previous session.
+
+Without '--url' the server is started in this process three times: wrapping every connection with a freshly loaded key
+and certificate as the server did before it kept one SSL context, then with the shared context for new clients and for
+returning ones. A throwaway certificate is made with the openssl tool unless '--cert' and '--key' are given.
+To measure the board or the unix port of MicroPython, start tools/host_server.py there with '--cert' and '--key' and
+point '--url' at it; the client itself needs CPython for session resumption.
+
+Usage:
+    python3 tools/bench_tls.py [--requests 100] [--url https://127.0.0.1:8443/sensors] [--cert c.pem --key k.pem]
+"""
+
+import sys, os, ssl, socket, subprocess, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'microserver'))
+
+from web.microWebSrv import MicroWebSrv
+from libraries.logging import logging
+
+PORT = 8443
+
+
+def _makeCert():
+    folder = tempfile.mkdtemp()
+    cert, key = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+    subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                           '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+def _request(ctx, host, port, path, session):
+    """Returns the handshake time in ms and the session to resume next time."""
+    t = time.perf_counter()
+    sock = socket.create_connection((host, port))
+    conn = ctx.wrap_socket(sock, server_hostname=host, session=session)
+    handshake = (time.perf_counter() - t) * 1000
+    conn.sendall(b"GET " + path.encode() + b" HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+    while conn.recv(4096):      # Reading the response also collects the TLS 1.3 session tickets
+        pass
+    resumed = conn.session_reused
+    session = conn.session
+    conn.close()
+    return handshake, session, resumed
+
+
+def _run(label, host, port, path, requests, resume):
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    times, session, resumed = [], None, 0
+    for i in range(requests + 1):
+        ms, newSession, reused = _request(ctx, host, port, path, session if resume else None)
+        if i:                   # The first connection only warms up, it has no session to resume yet
+            times.append(ms)
+            resumed += reused
+        session = newSession
+    times.sort()
+    mean = sum(times) / len(times)
+    print("%-28s mean %7.2f ms   median %7.2f ms   resumed %3d/%d" % (label, mean, times[len(times) // 2],
+                                                                        resumed, len(times)))
+    return mean
+
+
+def _serve(sslOptions, perConnection):
+    server = MicroWebSrv(routeHandlers=[('/sensors', 'GET', _httpHandlerSensorsGet)], port=PORT,
+                         webPath=tempfile.gettempdir(), sslOptions=sslOptions)
+    if perConnection:
+        server._wrapSocket = lambda s: MicroWebSrv._createSSLContext(sslOptions).wrap_socket(s, server_side=True)
+    server.Start(threaded=True)
+    while not server.IsStarted():
+        time.sleep(0.01)
+    return server
+
+
+def _httpHandlerSensorsGet(httpClient, httpResponse):
+    httpResponse.WriteResponseJSONOk({'temperature': 21.5, 'humidity': 40.2, 'lux': 310.0})
+
+
+def main(argv):
+    requests = 100
+    url = None
+    cert = key = None
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == '--requests':
+            requests = int(args.pop(0))
+        elif arg == '--url':
+            url = args.pop(0)
+        elif arg == '--cert':
+            cert = args.pop(0)
+        elif arg == '--key':
+            key = args.pop(0)
+    if url:
+        hostPort, _, path = url.split('://', 1)[-1].partition('/')
+        host, _, port = hostPort.partition(':')
+        port = int(port or 443)
+        _run('new clients', host, port, '/' + path, requests, False)
+        _run('returning clients', host, port, '/' + path, requests, True)
+        return
+    logging.basicConfig(level=logging.WARNING)
+    if cert is None:
+        cert, key = _makeCert()
+    with open(cert, 'rb') as f:
+        sslOptions = {'cert': f.read()}
+    with open(key, 'rb') as f:
+        sslOptions['key'] = f.read()
+    print("%d HTTPS requests per run, one connection each" % requests)
+    server = _serve(sslOptions, True)
+    before = _run('key loaded per connection', '127.0.0.1', PORT, '/sensors', requests, False)
+    server.Stop()
+    time.sleep(0.2)
+    server = _serve(sslOptions, False)
+    _run('shared context, new', '127.0.0.1', PORT, '/sensors', requests, False)
+    after = _run('shared context, returning', '127.0.0.1', PORT, '/sensors', requests, True)
+    server.Stop()
+    print("returning clients handshake %.1fx faster than before" % (before / after))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,63 @@
+"""
+MIT License
+Copyright (c) 2019 Samsung. n.herriot@samsung.com
+
+Build step which pre-compresses the web files served by the micro web server. For every compressible file in the www
+folder (HTML, CSS, Javascript, JSON, SVG, text...) a 'file.gz' sibling is written next to it when it is smaller than
+the original. The server sends the '.gz' file with 'Content-Encoding: gzip' to browsers which accept gzip, and the
+original file to all others, so both must be copied to the board.
+
+Run this again every time a web file changes, the server does not check that a '.gz' file is up to date.
+
+Usage:
+    python3 tools/gzip_www.py [www folder, default microserver/www] [--clean]
+"""
+
+import sys, os, gzip
+
+COMPRESSIBLE = ('.html', '.htm', '.css', '.js', '.json', '.svg', '.txt', '.xml', '.xhtml', '.csv', '.ico')
+MIN_SAVING = 0.9            # Only keep the '.gz' file if it is at most 90% of the original size
+
+
+def compress_tree(root):
+    total_in = total_out = 0
+    for folder, _, files in os.walk(root):
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            if not name.lower().endswith(COMPRESSIBLE):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            packed = gzip.compress(data, compresslevel=9, mtime=0)
+            if data and len(packed) <= len(data) * MIN_SAVING:
+                with open(path + '.gz', 'wb') as f:
+                    f.write(packed)
+                total_in += len(data)
+                total_out += len(packed)
+                print("%-40s %8d -> %8d octets" % (os.path.relpath(path, root), len(data), len(packed)))
+            elif os.path.exists(path + '.gz'):
+                os.remove(path + '.gz')
+    if total_out:
+        print("Total %d -> %d octets (%.1fx smaller)" % (total_in, total_out, float(total_in) / total_out))
+
+
+def clean_tree(root):
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if name.endswith('.gz'):
+                os.remove(os.path.join(folder, name))
+                print("Removed %s" % os.path.relpath(os.path.join(folder, name), root))
+
+
+def main(argv):
+    clean = '--clean' in argv
+    args = [a for a in argv if a != '--clean']
+    root = args[0] if args else os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'microserver', 'www')
+    if clean:
+        clean_tree(root)
+    else:
+        compress_tree(root)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,74 @@
+"""
+MIT License
+Copyright (c) 2019 Samsung. n.herriot@samsung.com
+
+Runs the MicroWebSrv from the microserver folder on a host (unix port of MicroPython or CPython) so it can be exercised
+with the load generator and benchmarks in this folder. No sensors are needed, the '/sensors' route serves fixed values and
+'/events' pushes a reading whose 'pir' count changes every 5 seconds. With '--cert' and '--key' (PEM or DER files) the
+server speaks HTTPS.
+
+Usage:
+    python3 tools/host_server.py [--port 8000] [--mode async|threaded] [--workers 0] [--backlog 5]
+                                [--cert cert.pem --key key.pem]
+"""
+
+import sys, os, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'microserver'))
+
+from web.microWebSrv import MicroWebSrv, MicroWebSrvEventSource
+from libraries.logging import logging
+
+
+@MicroWebSrv.route('/sensors')
+def _httpHandlerSensorsGet(httpClient, httpResponse):
+    httpResponse.WriteResponseJSONOk({'temperature': 21.5, 'humidity': 40.2, 'lux': 310.0})
+
+
+def _sampleSensors():
+    return {'temperature': 21.5, 'humidity': 40.2, 'lux': 310.0, 'pir': int(time.time()) // 5, 'radar': 0}
+
+
+_sensorEvents = MicroWebSrvEventSource(_sampleSensors, intervalSec=1)
+
+
+@MicroWebSrv.route('/events')
+def _httpHandlerEventsGet(httpClient, httpResponse):
+    return _sensorEvents.Accept(httpClient, httpResponse)
+
+
+def main(argv):
+    port = 8000
+    mode = 'async'
+    workers = 0
+    backlog = 5
+    sslOptions = None
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == '--port':
+            port = int(args.pop(0))
+        elif arg == '--mode':
+            mode = args.pop(0)
+        elif arg == '--workers':
+            workers = int(args.pop(0))
+        elif arg == '--backlog':
+            backlog = int(args.pop(0))
+        elif arg in ('--cert', '--key'):
+            with open(args.pop(0), 'rb') as f:
+                sslOptions = sslOptions or {}
+                sslOptions[arg[2:]] = f.read()
+    logging.basicConfig(level=logging.WARNING)
+    webPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'microserver', 'www')
+    server = MicroWebSrv(webPath=webPath, port=port, sslOptions=sslOptions)
+    server.WorkerThreads = workers
+    server.ListenBacklog = backlog
+    print("Serving %s on port %d in %s mode%s" % (webPath, port, mode, ' over HTTPS' if sslOptions else ''))
+    if mode == 'async':
+        server.Start(threaded=False, mode='async')
+    else:
+        server.Start(threaded=False)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
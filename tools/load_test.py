@@ -0,0 +1,119 @@
+"""
+MIT License
+Copyright (c) 2019 Samsung. n.herriot@samsung.com
+
+A small HTTP load generator to measure the throughput and latency of the micro web server, either on the board or on a
+host started with 'tools/host_server.py'. With '--keepalive 1' every client reuses one HTTP/1.1 connection for all of
+its requests instead of connecting for each one. Optionally opens a number of idle connections first which send a partial
+request and then stall, the way a slow browser on poor WiFi does, to show head-of-line blocking.
+
+Usage:
+    python3 tools/load_test.py http://127.0.0.1:8000/sensors [--clients 8] [--requests 200] [--slow 2] [--keepalive 1]
+"""
+
+import sys, socket, threading, time
+
+try:
+    from http.client import HTTPConnection
+except ImportError:
+    from httplib import HTTPConnection
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+
+def _request(host, port, path):
+    s = socket.create_connection((host, port), timeout=30)
+    try:
+        s.sendall(("GET %s HTTP/1.1\r\nHost: %s\r\nConnection: close\r\n\r\n" % (path, host)).encode())
+        size = 0
+        while True:
+            data = s.recv(4096)
+            if not data:
+                return size
+            size += len(data)
+    finally:
+        s.close()
+
+
+def run(url, clients=8, requests=200, slow=0, keepalive=0):
+    parts = urlsplit(url)
+    host, port, path = parts.hostname, parts.port or 80, parts.path or '/'
+    stalled = []
+    for _ in range(slow):
+        s = socket.create_connection((host, port))
+        s.sendall(b"GET / HTTP/1.1\r\n")
+        stalled.append(s)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker():
+        conn = None
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            t = time.time()
+            try:
+                if keepalive:
+                    if conn is not None:
+                        try:
+                            conn.request('GET', path)
+                            conn.getresponse().read()
+                        except Exception:
+                            conn.close()                # Closed by the server while idle, retry once like a browser does
+                            conn = None
+                    if conn is None:
+                        conn = HTTPConnection(host, port, timeout=30)
+                        conn.request('GET', path)
+                        conn.getresponse().read()
+                else:
+                    _request(host, port, path)
+                with lock:
+                    latencies.append(time.time() - t)
+            except Exception:
+                conn = None
+                with lock:
+                    errors[0] += 1
+        if conn is not None:
+            conn.close()
+
+    start = time.time()
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    for s in stalled:
+        s.close()
+    latencies.sort()
+    print("%d requests, %d clients, %d stalled connections, keep-alive %s" % (requests, clients, slow, 'on' if keepalive else 'off'))
+    print("  errors:      %d" % errors[0])
+    print("  throughput:  %.1f req/s" % (len(latencies) / elapsed))
+    if latencies:
+        print("  latency p50: %.1f ms" % (latencies[len(latencies) // 2] * 1000))
+        print("  latency p95: %.1f ms" % (latencies[int(len(latencies) * 0.95)] * 1000))
+        print("  latency max: %.1f ms" % (latencies[-1] * 1000))
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return
+    url = argv[0]
+    opts = {'--clients': 8, '--requests': 200, '--slow': 0, '--keepalive': 0}
+    args = argv[1:]
+    while args:
+        name = args.pop(0)
+        opts[name] = int(args.pop(0))
+    run(url, opts['--clients'], opts['--requests'], opts['--slow'], opts['--keepalive'])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])